@@ -18,6 +18,7 @@ try:
     from market_data.data_fetcher import MarketDataFetcher
     from timing.timing_selector import TimingSelector
     from strategy.strategy_matcher import StrategyMatcher
+    from news_analysis.news_fetcher import NewsFetcher
     from news_analysis.volume_analyzer import VolumeAnalyzer
     from news_analysis.premarket_analyzer import PremarketAnalyzer
     from news_analysis.ir_fetcher import IRFetcher
@@ -29,6 +30,7 @@ try:
         try_parse_date_from_csv,
         try_parse_date_from_filename,
     )
+    from market_data import deribit_client, finnhub_client, fmp_client, twelvedata_client
     from config import Config
 except Exception as e:
     traceback.print_exc(file=sys.stderr)
@@ -37,19 +39,73 @@ except Exception as e:
 
 from datetime import datetime, timezone
 import json
+import threading
+import time
+
+# orjson 可用時改用其序列化回應（較 stdlib json 快）；未安裝則維持 Flask 預設
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+if orjson is not None:
+    class ORJSONProvider(DefaultJSONProvider):
+        """以 orjson 輸出 JSON；datetime 等仍交給 Flask 預設 default 處理，輸出格式不變"""
+        _options = (
+            orjson.OPT_SORT_KEYS
+            | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_SERIALIZE_NUMPY
+            | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
+
 # 初始化模組
 data_fetcher = MarketDataFetcher()
 timing_selector = TimingSelector()
 strategy_matcher = StrategyMatcher()
-volume_analyzer = VolumeAnalyzer()
-premarket_analyzer = PremarketAnalyzer()
+# 聲量與盤前分析共用一個 NewsFetcher：同一組連線池、新聞快取與各主機限流
+news_fetcher = NewsFetcher()
+volume_analyzer = VolumeAnalyzer(news_fetcher=news_fetcher)
+premarket_analyzer = PremarketAnalyzer(news_fetcher=news_fetcher)
 ir_fetcher = IRFetcher()
 economic_calendar = EconomicCalendar()
 
+# 啟動時先與報價來源建立 keep-alive 連線（背景執行，不拖慢啟動），之後每 240 秒 ping 一次避免閒置連線被回收
+_WARMUP_INTERVAL = 240
+_warmup_lock = threading.Lock()
+_warmup_started = False
+
+
+def _keep_connections_warm():
+    while True:
+        for client in (finnhub_client, fmp_client, deribit_client):
+            client.warmup()
+        time.sleep(_WARMUP_INTERVAL)
+
+
+def start_connection_warmup():
+    """啟動連線預熱背景執行緒（同一程序只會啟動一次）"""
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    threading.Thread(target=_keep_connections_warm, name='connection-warmup', daemon=True).start()
+
+
+start_connection_warmup()
+
 @app.route('/')
 def index():
     """首頁"""
@@ -83,7 +139,6 @@ def get_ratio_history(ratio_id):
 def get_market_data():
     """獲取市場數據 API。可傳 sections=us_stocks,tw_markets,... 只取部分區塊以加快顯示。"""
     from flask import request
-    from datetime import datetime
     
     try:
         refresh = request.args.get('refresh', 'false').lower() == 'true'
@@ -95,6 +150,18 @@ def get_market_data():
             data_fetcher._earnings_cache_time = 0
             data_fetcher._earnings_cache_tw = None
             data_fetcher._earnings_cache_tw_time = 0
+            # 資料源客戶端的 ttl_cache（報價 15～60 秒、財報行事曆含磁碟快取）也一併清除；
+            # twelvedata_client.fetch_time_series（1 天）刻意不清：它只是比率歷史的備援來源，
+            # 長期日線不因刷新報價而變，且免費方案 8 次/分，清掉會讓下次比率計算耗盡額度
+            for cached in (
+                finnhub_client.get_quote,
+                finnhub_client.get_earnings_calendar,
+                fmp_client.get_index_quotes,
+                fmp_client.get_earnings_calendar,
+                deribit_client._get_ticker,
+                twelvedata_client.get_quote,
+            ):
+                cached.cache_clear()
         
         sections_param = request.args.get('sections', '').strip()
         sections = None
@@ -102,7 +169,6 @@ def get_market_data():
             sections = [s.strip() for s in sections_param.split(',') if s.strip()]
         
         summary = data_fetcher.get_market_summary(sections=sections if sections else None)
-        summary['timestamp'] = datetime.now(timezone.utc).isoformat()
         return jsonify({
             'success': True,
             'data': summary
@@ -357,7 +423,6 @@ def get_ir_meetings():
         if refresh:
             # 清除緩存強制刷新
             ir_fetcher.cache.clear()
-            ir_fetcher.cache_time.clear()
         
         timeline = ir_fetcher.get_ir_timeline(months_ahead=3)
         timeline['timestamp'] = datetime.now(timezone.utc).isoformat()
@@ -4,7 +4,11 @@
 from typing import Dict, Optional
 from datetime import datetime, timezone
 
-import requests
+from market_data.http_session import create_session
+from market_data.log_util import get_logger
+
+log = get_logger(__name__)
+SESSION = create_session()
 
 # Config 鍵（如 BTC-USD）-> Binance 交易對
 def _to_binance_symbol(config_key: str) -> str:
@@ -16,18 +20,18 @@ def _to_binance_symbol(config_key: str) -> str:
 def get_ticker_24h(binance_symbol: str) -> Optional[Dict]:
     """單一交易對 24h 報價。binance_symbol 如 BTCUSDT。"""
     try:
-        r = requests.get(
+        r = SESSION.get(
             "https://api.binance.com/api/v3/ticker/24hr",
             params={"symbol": binance_symbol},
             timeout=10,
         )
         if r.status_code == 429:
-            print(f"Binance rate limit (429) for {binance_symbol}, skip.")
+            log.warning("Binance rate limit (429) for %s, skip.", binance_symbol)
             return None
         r.raise_for_status()
         data = r.json()
     except Exception as e:
-        print(f"Binance ticker {binance_symbol}: {e}")
+        log.warning("Binance ticker %s: %s", binance_symbol, e)
         return None
     try:
         last = float(data.get("lastPrice", 0))
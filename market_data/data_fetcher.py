@@ -13,14 +13,41 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
+import threading
 import pytz
 from config import Config
 from market_data.finnhub_client import get_multiple_quotes as finnhub_get_multiple
 from market_data.fmp_client import get_earnings_calendar as fmp_get_earnings_calendar
 from market_data.deribit_client import get_multiple_crypto as deribit_get_multiple
+from market_data.yahoo_client import get_multiple_quotes as yahoo_get_multiple
+from market_data.log_util import get_logger
+
+log = get_logger(__name__)
+
 # 並行取得時每批最大執行緒數（降低可減輕單機負載與 Yahoo 壓力）
 MAX_WORKERS = 8
 
+
+class _RateLimiter:
+    """全域節流：多執行緒共用，只有整體請求速率超過 qps 時才等待（取代各處固定 sleep）"""
+
+    def __init__(self, qps: float):
+        self.interval = 1.0 / qps
+        self.lock = threading.Lock()
+        self.next = 0.0
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next - now
+            if wait > 0:
+                time.sleep(wait)
+            self.next = max(now, self.next) + self.interval
+
+
+# 對 Yahoo（yfinance）的整體請求速率上限
+_YF_LIMIT = _RateLimiter(qps=8)
+
 class MarketDataFetcher:
     """市場數據獲取器"""
     
@@ -36,6 +63,15 @@ class MarketDataFetcher:
         self._hist_cache = {}  # _fetch_hist 快取：(symbol, period) -> Series，讓比率摘要與歷史圖共用
         self._hist_cache_time = {}
         self._hist_cache_duration = 600  # 歷史序列快取 10 分鐘（Render 上減少重複 yf/TwelveData 請求）
+        # 常駐執行緒池：避免每次請求都建立／銷毀執行緒。
+        # 區塊與個股分開兩個池，區塊任務內再提交個股任務時才不會互相佔滿而卡死。
+        self._pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='mdf')
+        self._section_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='mdf-section')
+
+    def close(self) -> None:
+        """關閉常駐執行緒池（程序結束前呼叫）"""
+        self._section_pool.shutdown(wait=False)
+        self._pool.shutdown(wait=False)
     
     def _is_cache_valid(self, symbol: str) -> bool:
         """檢查緩存是否有效"""
@@ -63,6 +99,7 @@ class MarketDataFetcher:
             return self.cache[cache_key]
         
         try:
+            _YF_LIMIT.acquire()
             ticker = yf.Ticker(symbol)
             info = ticker.info
             
@@ -175,7 +212,7 @@ class MarketDataFetcher:
             return result
             
         except Exception as e:
-            print(f"Error fetching data for {symbol}: {str(e)}")
+            log.warning("Error fetching data for %s: %s", symbol, e)
             return None
     
     def get_multiple_markets(self, symbols: Dict[str, str], period: str = '1d') -> Dict[str, Dict]:
@@ -186,25 +223,36 @@ class MarketDataFetcher:
             return {}
         results = {}
         items = list(symbols.items())
-        n = min(MAX_WORKERS, len(items))
+
+        # 先以 Yahoo 批次報價一次補齊未快取的標的。批次結果不含 history，存在獨立的 _quote 快取鍵，
+        # 不佔用 get_market_data 的快取（個股策略建議等仍需完整資料）；
+        # 批次取不到的（如 Yahoo 擋 crumb）再由下方執行緒池逐檔走 yfinance
+        missing = [
+            sym for sym, _ in items
+            if not self._is_cache_valid(f"{sym}_{period}_quote") and not self._is_cache_valid(f"{sym}_{period}_1m")
+        ]
+        if missing:
+            now = time.time()
+            for sym, data in yahoo_get_multiple(missing).items():
+                cache_key = f"{sym}_{period}_quote"
+                self.cache[cache_key] = data
+                self.cache_time[cache_key] = now
 
         def fetch_one(item):
             symbol, name = item
-            data = self.get_market_data(symbol, period=period)
-            if data:
-                data = dict(data)
-                data['display_name'] = name
-                return (symbol, data)
-            return (symbol, None)
-
-        with ThreadPoolExecutor(max_workers=n) as executor:
-            for future in as_completed(executor.submit(fetch_one, item) for item in items):
-                try:
-                    symbol, data = future.result()
-                    if data:
-                        results[symbol] = data
-                except Exception:
-                    pass
+            quote_key = f"{symbol}_{period}_quote"
+            if self._is_cache_valid(quote_key):
+                return (symbol, self.cache[quote_key], name)
+            return (symbol, self.get_market_data(symbol, period=period), name)
+
+        for future in as_completed([self._pool.submit(fetch_one, item) for item in items]):
+            try:
+                symbol, data, name = future.result()
+                if data:
+                    # 快取內的 dict 不含 display_name，僅在輸出時合併一次（避免改到快取物件）
+                    results[symbol] = {**data, 'display_name': name}
+            except Exception:
+                pass
         return results
 
     def _get_us_stocks(self) -> Dict[str, Dict]:
@@ -239,6 +287,7 @@ class MarketDataFetcher:
                 return self._hist_cache[cache_key]
         result = None
         try:
+            _YF_LIMIT.acquire()
             ticker = yf.Ticker(symbol)
             df = ticker.history(period=period, interval='1d')
             if df is not None and not df.empty and 'Close' in df.columns:
@@ -246,14 +295,12 @@ class MarketDataFetcher:
                 if not s.empty:
                     result = s
         except Exception as e:
-            print(f"yfinance history {symbol}: {e}")
+            log.warning("yfinance history %s: %s", symbol, e)
         if result is None or result.empty:
             td_key = getattr(Config, 'TWELVEDATA_API_KEY', None) or ''
             if td_key:
                 from market_data.twelvedata_client import fetch_time_series
                 result = fetch_time_series(td_key, symbol, period)
-                if result is None or result.empty:
-                    time.sleep(0.5)
         if result is not None and not result.empty:
             self._hist_cache[cache_key] = result
             self._hist_cache_time[cache_key] = time.time()
@@ -284,7 +331,6 @@ class MarketDataFetcher:
         unit = defn.get('unit', '倍')
         desc = defn.get('desc', '')
         num_series = self._fetch_hist(num_sym, period)
-        time.sleep(0.15)
         denom_series = self._fetch_hist(denom_sym, period)
         if num_series is None or denom_series is None:
             return {
@@ -372,7 +418,6 @@ class MarketDataFetcher:
         for defn in definitions:
             r = self._compute_one_ratio(defn)
             ratios.append(r)
-            time.sleep(0.1)
         out = {
             'ratios': ratios,
             'timestamp': datetime.now(timezone.utc).isoformat(),
@@ -394,7 +439,6 @@ class MarketDataFetcher:
         denom_sym = defn.get('denom', '')
         period = defn.get('period', '20y')
         num_series = self._fetch_hist(num_sym, period)
-        time.sleep(0.15)
         denom_series = self._fetch_hist(denom_sym, period)
         if num_series is None or denom_series is None:
             return None
@@ -426,9 +470,10 @@ class MarketDataFetcher:
             'values': values,
         }
 
-    def _yf_earnings_for_symbol(self, symbol: str, name: str, today, end_date, tz_et) -> Optional[Dict]:
-        """單一 symbol 從 yfinance 取得 60 天內財報日（get_earnings_dates + calendar 雙重 fallback）"""
+    def _yf_earnings_for_symbol(self, symbol: str, name: str, today, end_date, tz) -> Optional[Dict]:
+        """單一 symbol 從 yfinance 取得 60 天內財報日（get_earnings_dates + calendar 雙重 fallback），美股台股共用，tz 為該市場時區"""
         try:
+            _YF_LIMIT.acquire()
             ticker = yf.Ticker(symbol)
             next_date = None
             # 方法 1：get_earnings_dates
@@ -438,7 +483,7 @@ class MarketDataFetcher:
                     try:
                         ts = pd.Timestamp(d)
                         if ts.tz is not None:
-                            ts = ts.tz_convert(tz_et)
+                            ts = ts.tz_convert(tz)
                         d_date = ts.date()
                     except Exception:
                         continue
@@ -479,7 +524,11 @@ class MarketDataFetcher:
         now = time.time()
         if not force_refresh and self._earnings_cache is not None and (now - self._earnings_cache_time) < self._earnings_cache_duration:
             return self._earnings_cache
+        if force_refresh:
+            # FMP 財報行事曆另有 ttl_cache（含磁碟），強制刷新時一併清除
+            fmp_get_earnings_calendar.cache_clear()
         try:
+            us_stocks = Config.US_STOCKS
             tz_et = pytz.timezone('US/Eastern')
             today = datetime.now(tz_et).date()
             end_date = today + timedelta(days=days_ahead)
@@ -489,63 +538,24 @@ class MarketDataFetcher:
                     fmp_key,
                     today.strftime('%Y-%m-%d'),
                     end_date.strftime('%Y-%m-%d'),
-                    Config.US_STOCKS,
+                    us_stocks,
                 )
                 if result:
                     self._earnings_cache = result
                     self._earnings_cache_time = now
                     return result
             result = {}
-            for symbol, name in Config.US_STOCKS.items():
+            for symbol, name in us_stocks.items():
                 ec = self._yf_earnings_for_symbol(symbol, name, today, end_date, tz_et)
                 if ec:
                     result[symbol] = ec
-                time.sleep(0.12)
             self._earnings_cache = result
             self._earnings_cache_time = now
             return result
         except Exception as e:
-            print(f"get_earnings_calendar error: {e}")
+            log.warning("get_earnings_calendar error: %s", e)
             return self._earnings_cache or {}
 
-    def _yf_earnings_for_symbol_tw(self, symbol: str, name: str, today, end_date, tz_tw) -> Optional[Dict]:
-        """台股單一 symbol：yfinance get_earnings_dates + calendar fallback"""
-        try:
-            ticker = yf.Ticker(symbol)
-            next_date = None
-            ed = ticker.get_earnings_dates()
-            if ed is not None and not ed.empty:
-                for d in ed.index:
-                    try:
-                        ts = pd.Timestamp(d)
-                        if ts.tz is not None:
-                            ts = ts.tz_convert(tz_tw)
-                        d_date = ts.date()
-                    except Exception:
-                        continue
-                    if today <= d_date <= end_date:
-                        if next_date is None or d_date < next_date:
-                            next_date = d_date
-            if next_date is None:
-                cal = getattr(ticker, 'calendar', None) or (getattr(ticker, 'get_calendar', lambda: None)())
-                if isinstance(cal, dict):
-                    ed_cal = cal.get('Earnings Date')
-                    if ed_cal is not None:
-                        for d in (ed_cal if isinstance(ed_cal, list) else [ed_cal]):
-                            try:
-                                d_date = d.date() if hasattr(d, 'date') else d
-                                if today <= d_date <= end_date:
-                                    if next_date is None or d_date < next_date:
-                                        next_date = d_date
-                            except Exception:
-                                pass
-            if next_date is not None:
-                days_until = (next_date - today).days
-                return {'date': next_date.strftime('%Y-%m-%d'), 'days_until': days_until, 'name': name}
-        except Exception:
-            pass
-        return None
-
     def get_earnings_calendar_tw(self, days_ahead: int = 60, force_refresh: bool = False) -> Dict[str, Dict]:
         """
         取得台股接下來 N 天內的財報公布日（依 Config.TW_MARKETS，排除指數如 ^TWII）。
@@ -560,18 +570,18 @@ class MarketDataFetcher:
             today = datetime.now(tz_tw).date()
             end_date = today + timedelta(days=days_ahead)
             result = {}
-            for symbol, name in Config.TW_MARKETS.items():
+            tw_markets = Config.TW_MARKETS
+            for symbol, name in tw_markets.items():
                 if symbol.startswith('^'):
                     continue
-                ec = self._yf_earnings_for_symbol_tw(symbol, name, today, end_date, tz_tw)
+                ec = self._yf_earnings_for_symbol(symbol, name, today, end_date, tz_tw)
                 if ec:
                     result[symbol] = ec
-                time.sleep(0.12)
             self._earnings_cache_tw = result
             self._earnings_cache_tw_time = now
             return result
         except Exception as e:
-            print(f"get_earnings_calendar_tw error: {e}")
+            log.warning("get_earnings_calendar_tw error: %s", e)
             return self._earnings_cache_tw or {}
 
     def _get_comex_session(self) -> str:
@@ -603,6 +613,7 @@ class MarketDataFetcher:
         if self._is_cache_valid(cache_key):
             return self.cache[cache_key]
         try:
+            _YF_LIMIT.acquire()
             ticker = yf.Ticker(symbol)
             df = ticker.history(period=period, interval='1d')
             if df is None or df.empty or 'Close' not in df.columns:
@@ -630,7 +641,7 @@ class MarketDataFetcher:
             self.cache_time[cache_key] = time.time()
             return out
         except Exception as e:
-            print(f"Error fetching stock history for {symbol}: {e}")
+            log.warning("Error fetching stock history for %s: %s", symbol, e)
             return None
 
     def get_market_summary(self, sections: Optional[List[str]] = None) -> Dict:
@@ -638,6 +649,14 @@ class MarketDataFetcher:
         獲取市場總覽（美股／台股／國際／重金屬／加密等並行取得，加快速度）。
         sections: 若提供則只取得指定區塊（例：['us_stocks','tw_markets']），以減輕單次請求負載。
         """
+        # 設定只讀一次，後續以區域變數引用
+        us_stocks_cfg = getattr(Config, 'US_STOCKS', {})
+        tw_markets_cfg = getattr(Config, 'TW_MARKETS', {})
+        etf_cfg = getattr(Config, 'ETF', {})
+        international_cfg = getattr(Config, 'INTERNATIONAL_MARKETS', {})
+        metals_futures_cfg = getattr(Config, 'METALS_FUTURES', {})
+        crypto_cfg = getattr(Config, 'CRYPTO', {})
+        iso_now = datetime.now(timezone.utc).isoformat()  # 本次總覽共用一個時間戳
         session = self._get_comex_session()
         try:
             et_now = datetime.now(pytz.timezone('US/Eastern'))
@@ -647,10 +666,10 @@ class MarketDataFetcher:
 
         all_tasks = {
             'us_stocks': lambda: self._get_us_stocks(),
-            'tw_markets': lambda: self.get_multiple_markets(Config.TW_MARKETS),
-            'etf': lambda: self.get_multiple_markets(getattr(Config, 'ETF', {})),
-            'international_markets': lambda: self.get_multiple_markets(Config.INTERNATIONAL_MARKETS),
-            'metals_futures_raw': lambda: self.get_multiple_markets(getattr(Config, 'METALS_FUTURES', {})),
+            'tw_markets': lambda: self.get_multiple_markets(tw_markets_cfg),
+            'etf': lambda: self.get_multiple_markets(etf_cfg),
+            'international_markets': lambda: self.get_multiple_markets(international_cfg),
+            'metals_futures_raw': lambda: self.get_multiple_markets(metals_futures_cfg),
             'crypto': lambda: self._get_crypto_deribit(),
             'ratios': lambda: self.get_ratios_summary(),
         }
@@ -665,17 +684,16 @@ class MarketDataFetcher:
             tasks = all_tasks
 
         out = {}
-        with ThreadPoolExecutor(max_workers=min(8, len(tasks))) as executor:
-            f2k = {executor.submit(fn): k for k, fn in tasks.items()}
-            for future in as_completed(f2k):
-                k = f2k[future]
-                try:
-                    out[k] = future.result()
-                except Exception:
-                    if k == 'ratios':
-                        out[k] = {'ratios': [], 'timestamp': datetime.now(timezone.utc).isoformat()}
-                    else:
-                        out[k] = {} if k != 'metals_futures_raw' else {}
+        f2k = {self._section_pool.submit(fn): k for k, fn in tasks.items()}
+        for future in as_completed(f2k):
+            k = f2k[future]
+            try:
+                out[k] = future.result()
+            except Exception:
+                if k == 'ratios':
+                    out[k] = {'ratios': [], 'timestamp': iso_now}
+                else:
+                    out[k] = {} if k != 'metals_futures_raw' else {}
 
         metals_futures_raw = out.get('metals_futures_raw', {})
         metals_futures = {sym: dict(d, session=session) for sym, d in metals_futures_raw.items()}
@@ -719,7 +737,7 @@ class MarketDataFetcher:
             earnings_list_tw.sort(key=lambda x: (x['date'], x['symbol']))
 
         summary = {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': iso_now,
         }
         if sections is None or 'ratios' in sections:
             summary['ratios'] = ratios_data
@@ -743,12 +761,12 @@ class MarketDataFetcher:
 
         # 回傳「有請求但無資料」的標的，方便比對是否代碼錯誤或環境差異（如 Render 與本機）
         section_to_config = {
-            'us_stocks': getattr(Config, 'US_STOCKS', {}),
-            'tw_markets': getattr(Config, 'TW_MARKETS', {}),
-            'etf': getattr(Config, 'ETF', {}),
-            'international_markets': getattr(Config, 'INTERNATIONAL_MARKETS', {}),
-            'metals_futures': getattr(Config, 'METALS_FUTURES', {}),
-            'crypto': getattr(Config, 'CRYPTO', {}),
+            'us_stocks': us_stocks_cfg,
+            'tw_markets': tw_markets_cfg,
+            'etf': etf_cfg,
+            'international_markets': international_cfg,
+            'metals_futures': metals_futures_cfg,
+            'crypto': crypto_cfg,
         }
         skipped_symbols = []
         for sec, config_dict in section_to_config.items():
@@ -2,13 +2,21 @@
 Deribit 加密貨幣報價（公開 API，無需 key）
 BTC/ETH/SOL 用 Deribit 永續 ticker；其餘用 yfinance（有 24h 漲跌）
 """
-from typing import Dict, Optional
+import functools
+from typing import TYPE_CHECKING, Dict, Optional
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-import yfinance as yf
+from market_data.http_session import create_session, loads_json
+from market_data.log_util import get_logger
+from market_data.ttl_cache import ttl_cache
 
+if TYPE_CHECKING:
+    import yfinance as yf
+
+log = get_logger(__name__)
 DERIBIT_API = "https://www.deribit.com/api/v2"
+SESSION = create_session(http2=True)
 
 # Config 鍵（如 BTC-USD）-> Deribit 永續合約名稱（有則用 ticker 取得 24h 數據）
 TICKER_INSTRUMENTS = {
@@ -18,10 +26,43 @@ TICKER_INSTRUMENTS = {
 }
 
 
-def _get_ticker(instrument_name: str) -> Optional[Dict]:
+def warmup() -> None:
+    """預先建立到 Deribit 的 keep-alive 連線（回應內容忽略）。"""
+    try:
+        SESSION.get(f"{DERIBIT_API}/public/test", timeout=3)
+    except Exception:
+        pass
+
+
+def _parse_ticker(res: Dict, now_iso: Optional[str] = None) -> Optional[Dict]:
+    """將 public/ticker 的 result 轉成通用報價欄位。now_iso 為批次共用的時間戳。"""
+    last = res.get("last_price") or res.get("index_price")
+    if last is None:
+        return None
+    stats = res.get("stats") or {}
+    pct = stats.get("price_change")
+    if pct is None:
+        pct = 0
+    prev = last / (1 + pct / 100) if pct else last
+    return {
+        "current_price": round(float(last), 2),
+        "previous_close": round(float(prev), 2),
+        "change": round(float(last) - float(prev), 2),
+        "change_percent": round(float(pct), 2),
+        "volume": int(float(stats.get("volume", 0) or 0)),
+        "high": round(float(stats.get("high", last)), 2),
+        "low": round(float(stats.get("low", last)), 2),
+        "open": round(float(prev), 2),
+        "timestamp": now_iso or datetime.now(timezone.utc).isoformat(),
+        "history": [],
+    }
+
+
+@ttl_cache(ttl=15, ignore=("now_iso",))
+def _get_ticker(instrument_name: str, now_iso: Optional[str] = None) -> Optional[Dict]:
     """取得永續合約 ticker（24h 數據）。"""
     try:
-        r = requests.post(
+        r = SESSION.post(
             f"{DERIBIT_API}/public/ticker",
             json={
                 "jsonrpc": "2.0",
@@ -34,40 +75,26 @@ def _get_ticker(instrument_name: str) -> Optional[Dict]:
         )
         if r.status_code != 200:
             return None
-        data = r.json()
+        data = loads_json(r.content)
         if "result" not in data:
             return None
-        res = data["result"]
-        last = res.get("last_price") or res.get("index_price")
-        if last is None:
-            return None
-        stats = res.get("stats") or {}
-        pct = stats.get("price_change")
-        if pct is None:
-            pct = 0
-        prev = last / (1 + pct / 100) if pct else last
-        return {
-            "current_price": round(float(last), 2),
-            "previous_close": round(float(prev), 2),
-            "change": round(float(last) - float(prev), 2),
-            "change_percent": round(float(pct), 2),
-            "volume": int(float(stats.get("volume", 0) or 0)),
-            "high": round(float(stats.get("high", last)), 2),
-            "low": round(float(stats.get("low", last)), 2),
-            "open": round(float(prev), 2),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "history": [],
-        }
+        return _parse_ticker(data["result"], now_iso)
     except Exception as e:
-        print(f"Deribit ticker {instrument_name}: {e}")
+        log.warning("Deribit ticker %s: %s", instrument_name, e)
         return None
 
 
-def _get_yf_crypto(symbol: str) -> Optional[Dict]:
-    """yfinance 取得加密貨幣（含 24h 漲跌）。"""
+@functools.lru_cache(maxsize=128)
+def _yf_ticker(symbol: str) -> "yf.Ticker":
+    """重用 yf.Ticker 物件（建構時會處理 cookie／session）。yfinance 延後到真的需要時才匯入。"""
+    import yfinance as yf
+    return yf.Ticker(symbol)
+
+
+def _get_yf_crypto(symbol: str, now_iso: Optional[str] = None) -> Optional[Dict]:
+    """yfinance 取得加密貨幣（含 24h 漲跌）。只用日線 OHLC，不取 ticker.info。"""
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info or {}
+        ticker = _yf_ticker(symbol)
         hist = ticker.history(period="2d", interval="1d")
         if hist is None or hist.empty or "Close" not in hist.columns:
             return None
@@ -87,22 +114,30 @@ def _get_yf_crypto(symbol: str) -> Optional[Dict]:
             "high": round(float(h), 2),
             "low": round(float(lo), 2),
             "open": round(prev, 2),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": now_iso or datetime.now(timezone.utc).isoformat(),
             "history": [],
         }
     except Exception as e:
-        print(f"yfinance crypto {symbol}: {e}")
+        log.warning("yfinance crypto %s: %s", symbol, e)
         return None
 
 
-def get_single_crypto(config_key: str) -> Optional[Dict]:
-    """取得單一加密貨幣報價。config_key 如 BTC-USD。BTC/ETH/SOL 用 Deribit ticker，其餘用 yfinance（有漲跌）。"""
+def get_single_crypto(config_key: str, now_iso: Optional[str] = None) -> Optional[Dict]:
+    """
+    取得單一加密貨幣報價。config_key 如 BTC-USD。BTC/ETH/SOL 用 Deribit ticker，其餘用 yfinance（有漲跌）。
+    now_iso: 批次呼叫時共用的時間戳。
+    Deribit 暫時失敗時先再試一次 Deribit，仍失敗才退回較慢的 yfinance。
+    """
     inst = TICKER_INSTRUMENTS.get(config_key)
     if inst:
-        out = _get_ticker(inst)
+        out = (
+            _get_ticker(inst, now_iso=now_iso)
+            # 失敗結果（None）不進 ttl_cache，第二次呼叫會真的重新請求
+            or _get_ticker(inst, now_iso=now_iso)
+        )
         if out:
             return out
-    return _get_yf_crypto(config_key)
+    return _get_yf_crypto(config_key, now_iso)
 
 
 def get_multiple_crypto(symbols_display: Dict[str, str]) -> Dict[str, Dict]:
@@ -112,14 +147,21 @@ def get_multiple_crypto(symbols_display: Dict[str, str]) -> Dict[str, Dict]:
     """
     if not symbols_display:
         return {}
+    keys = [k for k in symbols_display if k != "USDT-USD"]  # 穩定幣跳過
+    if not keys:
+        return {}
+    deribit_keys = [k for k in keys if k in TICKER_INSTRUMENTS]
+    yf_keys = [k for k in keys if k not in TICKER_INSTRUMENTS]
+    # Deribit 組（回應快）先提交，yfinance 組排在後面；各標的在執行緒池個別取得
+    pending = deribit_keys + yf_keys
+    now_iso = datetime.now(timezone.utc).isoformat()
+    with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+        results = dict(zip(pending, executor.map(lambda k: get_single_crypto(k, now_iso), pending)))
     out = {}
-    for config_key, display_name in symbols_display.items():
-        if config_key == "USDT-USD":
-            continue  # 穩定幣跳過
-        data = get_single_crypto(config_key)
+    for config_key in keys:
+        data = results.get(config_key)
         if data:
-            data["symbol"] = config_key
-            data["name"] = display_name
-            data["display_name"] = display_name
-            out[config_key] = data
+            display_name = symbols_display[config_key]
+            # data 可能是 ttl_cache 內的物件，輸出時另建 dict，不改動快取
+            out[config_key] = {**data, "symbol": config_key, "name": display_name, "display_name": display_name}
     return out
@@ -2,12 +2,22 @@
 Finnhub 美股報價（美股、美股指數）
 免費 60 次/分，需 API key：FINNHUB_API_KEY
 """
+import functools
 import os
-import time
 from typing import Dict, Optional
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+from market_data.http_session import create_session, loads_json
+from market_data.log_util import get_logger
+from market_data.rate_limit import TokenBucket
+from market_data.ttl_cache import ttl_cache
+
+log = get_logger(__name__)
+SESSION = create_session(http2=True)
+# 免費方案 60 次/分：每秒補 0.5 次、最多累積 30 次，任一分鐘內最多 30 + 30 = 60 次（報價與財報行事曆共用）；
+# 持續請求時平均每分鐘 30 次
+_BUCKET = TokenBucket(rate=0.5, capacity=30)
 
 # Finnhub 用 - 取代 . 如 BRK.B -> BRK-B；指數用 .SPX 等
 FINNHUB_INDEX_MAP = {
@@ -17,8 +27,12 @@ FINNHUB_INDEX_MAP = {
     "^NDX": ".NDX",
     "^RUT": ".RUT",
 }
+# 反查表：Finnhub 代碼（.SPX 或 -SPX 形式）-> Config 鍵
+_CONFIG_FROM_FINNHUB = {fh: cfg for cfg, fh in FINNHUB_INDEX_MAP.items()}
+_CONFIG_FROM_FINNHUB_DASH = {fh.replace(".", "-"): cfg for cfg, fh in FINNHUB_INDEX_MAP.items()}
 
 
+@functools.lru_cache(maxsize=512)
 def _finnhub_symbol(symbol: str) -> str:
     if not isinstance(symbol, str):
         return symbol
@@ -27,24 +41,47 @@ def _finnhub_symbol(symbol: str) -> str:
     return symbol.replace(".", "-")
 
 
-def get_quote(api_key: str, symbol: str, display_name: str) -> Optional[Dict]:
+def warmup() -> None:
+    """預先建立到 Finnhub 的 keep-alive 連線（回應內容忽略）。"""
+    try:
+        SESSION.get("https://finnhub.io/api/v1/quote", params={"symbol": "AAPL", "token": ""}, timeout=3)
+    except Exception:
+        pass
+
+
+@functools.lru_cache(maxsize=512)
+def _to_config_symbol(s: str) -> str:
+    """還原 symbol：Finnhub 用 BRK-B，我們 key 是 BRK.B"""
+    if not s:
+        return s
+    return (
+        _CONFIG_FROM_FINNHUB.get(s)
+        or _CONFIG_FROM_FINNHUB_DASH.get(s)
+        or (s.replace("-", ".") if s.startswith("BRK") else s)
+    )
+
+
+@ttl_cache(ttl=15, skip_args=1, ignore=("now_iso",))
+def get_quote(api_key: str, symbol: str, display_name: str, now_iso: Optional[str] = None) -> Optional[Dict]:
     """
     取得單一標的報價，回傳與 data_fetcher.get_market_data 相容的格式。
     symbol: 如 AAPL, ^GSPC（Finnhub 可能接受或需對應 .SPX 等）
+    now_iso: 批次呼叫時由呼叫端傳入共用的時間戳，未傳則自行取得
     """
     if not api_key or api_key.strip() == "":
         return None
     sym = _finnhub_symbol(symbol)
     url = "https://finnhub.io/api/v1/quote"
     try:
-        r = requests.get(url, params={"symbol": sym, "token": api_key}, timeout=10)
+        _BUCKET.acquire()
+        r = SESSION.get(url, params={"symbol": sym, "token": api_key}, timeout=10)
         if r.status_code == 429:
-            print(f"Finnhub rate limit (429) for {symbol}, skip.")
+            log.warning("Finnhub rate limit (429) for %s, skip.", symbol)
             return None
         r.raise_for_status()
-        data = r.json()
+        data = loads_json(r.content)
     except Exception as e:
-        print(f"Finnhub quote {symbol}: {e}")
+        log.warning("Finnhub quote %s: %s", symbol, e)
         return None
     c = data.get("c")  # current
     pc = data.get("pc")  # previous close
@@ -72,7 +109,7 @@ def get_quote(api_key: str, symbol: str, display_name: str) -> Optional[Dict]:
         "high": round(float(h), 2) if h is not None else None,
         "low": round(float(l), 2) if l is not None else None,
         "open": round(float(o), 2) if o is not None else None,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": now_iso or datetime.now(timezone.utc).isoformat(),
         "history": [],
     }
 
@@ -80,24 +117,27 @@ def get_quote(api_key: str, symbol: str, display_name: str) -> Optional[Dict]:
 def get_multiple_quotes(
     api_key: str,
     symbols: Dict[str, str],
-    delay_seconds: float = 1.05,
+    max_workers: int = 8,
 ) -> Dict[str, Dict]:
     """
-    依序取得多個標的（遵守 60 次/分 ≈ 每請求間隔 1 秒）。
+    並行取得多個標的，由 token bucket 控制整體速率（遵守 60 次/分）。
     回傳 { symbol: { ...market_data }, ... }
     """
     if not api_key or not symbols:
         return {}
+    items = list(symbols.items())
+    now_iso = datetime.now(timezone.utc).isoformat()
     out = {}
-    for symbol, name in symbols.items():
-        d = get_quote(api_key, symbol, name)
-        if d:
-            d["display_name"] = name
-            out[symbol] = d
-        time.sleep(delay_seconds)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        results = executor.map(lambda item: get_quote(api_key, item[0], item[1], now_iso=now_iso), items)
+        for (symbol, name), d in zip(items, results):
+            if d:
+                # get_quote 回傳的是快取內的物件，輸出時另建 dict，不改動快取
+                out[symbol] = {**d, "display_name": name}
     return out
 
 
+@ttl_cache(ttl=3600 * 6, skip_args=1, persist="finnhub_earnings")
 def get_earnings_calendar(
     api_key: str,
     from_date: str,
@@ -112,9 +152,12 @@ def get_earnings_calendar(
     """
     if not api_key or not api_key.strip():
         return {}
+    if not symbols_display:
+        return {}
     url = "https://finnhub.io/api/v1/calendar/earnings"
     try:
-        r = requests.get(
+        _BUCKET.acquire()
+        r = SESSION.get(
             url,
             params={"from": from_date, "to": to_date, "token": api_key},
             timeout=15,
@@ -122,45 +165,48 @@ def get_earnings_calendar(
         if r.status_code == 429:
             return {}
         r.raise_for_status()
-        data = r.json()
+        data = loads_json(r.content)
     except Exception as e:
-        print(f"Finnhub earnings calendar: {e}")
+        log.warning("Finnhub earnings calendar: %s", e)
         return {}
     # Finnhub 回傳 { "earningsCalendar": [ { "symbol": "AAPL", "date": "2026-02-28", ... }, ... ] }
     items = data.get("earningsCalendar") if isinstance(data, dict) else []
+    del data
     if not isinstance(items, list):
         return {}
-    # 還原 symbol：Finnhub 用 BRK-B，我們 key 是 BRK.B
-    def to_config_symbol(s: str) -> str:
-        if not s:
-            return s
-        for cfg, fh in FINNHUB_INDEX_MAP.items():
-            if fh == s or fh.replace(".", "-") == s:
-                return cfg
-        return s.replace("-", ".") if "BRK" in s.upper() else s
-    today = datetime.now(timezone.utc).date()
+    # 區間內通常有上千筆、只保留極少數：先以 Finnhub 原始代碼的集合篩掉，其餘才做轉換與日期解析
+    wanted_raw = set()
+    for cfg in symbols_display:
+        fh = FINNHUB_INDEX_MAP.get(cfg)
+        if fh:
+            wanted_raw.update((fh, fh.replace(".", "-")))
+        else:
+            wanted_raw.update((cfg, cfg.replace(".", "-")))
+    today_ord = datetime.now(timezone.utc).date().toordinal()
     result = {}
     for item in items:
         if not isinstance(item, dict):
             continue
         sym = item.get("symbol")
+        if sym not in wanted_raw:
+            continue
         d = item.get("date")
-        if not sym or not d:
+        if not d:
             continue
-        sym_key = to_config_symbol(sym)
+        sym_key = _to_config_symbol(sym)
         if sym_key not in symbols_display:
             continue
         try:
-            ed = datetime.strptime(d[:10], "%Y-%m-%d").date()
-        except Exception:
+            d10 = d[:10]
+            days_until = date.fromisoformat(d10).toordinal() - today_ord
+        except (TypeError, ValueError):
             continue
-        days_until = (ed - today).days
         if days_until < 0:
             continue
-        if sym_key in result and result[sym_key]["date"] < d[:10]:
+        if sym_key in result and result[sym_key]["date"] < d10:
             continue
         result[sym_key] = {
-            "date": d[:10],
+            "date": d10,
             "days_until": days_until,
             "name": symbols_display.get(sym_key, sym_key),
         }
@@ -3,10 +3,15 @@ Financial Modeling Prep API 客戶端
 用於財報行事曆、美股指數報價（免費方案可用）
 """
 from urllib.parse import quote
-import requests
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Dict, Optional
 
+from market_data.http_session import create_session, loads_json
+from market_data.log_util import get_logger
+from market_data.ttl_cache import ttl_cache
+
+log = get_logger(__name__)
+SESSION = create_session(http2=True)
 
 # FMP 回傳 symbol 可能為 ^GSPC 或 GSPC，對應到我們 Config 的 key
 _FMP_SYMBOL_TO_CONFIG = {
@@ -15,73 +20,90 @@ _FMP_SYMBOL_TO_CONFIG = {
 }
 
 
+def _round_or_none(value) -> Optional[float]:
+    return round(float(value), 2) if value else None
+
+
+def _parse_index_quotes(data, symbols: Dict[str, str], want: set, now_iso: str) -> Dict[str, Dict]:
+    """解析 FMP 報價回應（list 或 {'data': list}），只處理 symbols 內的標的，每個欄位只讀一次。"""
+    if isinstance(data, dict) and "data" in data:
+        data = data["data"]
+    if not isinstance(data, list):
+        return {}
+    out = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        sym_raw = item.get("symbol") or ""
+        sym = _FMP_SYMBOL_TO_CONFIG.get(sym_raw) or (sym_raw if sym_raw in want else None)
+        if sym not in symbols:
+            continue
+        try:
+            c = float(item.get("price") or 0)
+            if c <= 0:
+                continue
+            pc = float(item.get("previousClose") or c)
+            ch = float(item.get("changesPercentage") or 0)
+            name = symbols[sym]
+            out[sym] = {
+                "symbol": sym,
+                "name": name,
+                "display_name": name,
+                "current_price": round(c, 2),
+                "previous_close": round(pc, 2),
+                "change": round(c - pc, 2),
+                "change_percent": round(ch, 2),
+                "volume": int(item.get("volume") or 0),
+                "high": _round_or_none(item.get("dayHigh")),
+                "low": _round_or_none(item.get("dayLow")),
+                "open": _round_or_none(item.get("open")),
+                "timestamp": now_iso,
+                "history": [],
+            }
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def warmup() -> None:
+    """預先建立到 FMP 的 keep-alive 連線（回應內容忽略）。"""
+    try:
+        SESSION.get("https://financialmodelingprep.com/", timeout=3)
+    except Exception:
+        pass
+
+
+@ttl_cache(ttl=15, skip_args=1)
 def get_index_quotes(api_key: str, symbols: Dict[str, str]) -> Dict[str, Dict]:
     """
-    美股指數報價。優先使用 FMP stable/batch-index-quotes，失敗時嘗試 v3/quote。
+    美股指數報價。優先使用 FMP v3/quote/{A,B,C}（一次請求取得全部），失敗時嘗試 stable/batch-index-quotes。
     symbols: Config.US_INDICES 格式 { '^GSPC': 'S&P 500', ... }
     回傳 { symbol: { current_price, change, change_percent, ... }, ... }
     """
     if not api_key or not api_key.strip() or not symbols:
         return {}
     want = set(symbols.keys())
+    now_iso = datetime.now(timezone.utc).isoformat()
 
-    def _parse_response(data) -> Dict[str, Dict]:
-        if isinstance(data, dict) and "data" in data:
-            data = data["data"]
-        if not isinstance(data, list):
-            return {}
-        out = {}
-        for item in data:
-            if not isinstance(item, dict):
-                continue
-            sym_raw = item.get("symbol") or ""
-            sym = _FMP_SYMBOL_TO_CONFIG.get(sym_raw) or (sym_raw if sym_raw in want else None)
-            if sym not in symbols:
-                continue
-            try:
-                c = float(item.get("price", 0) or 0)
-                pc = float(item.get("previousClose", c) or c)
-                ch = float(item.get("changesPercentage", 0) or 0)
-                change = c - pc if pc else 0
-                if c <= 0:
-                    continue
-                out[sym] = {
-                    "symbol": sym,
-                    "name": symbols[sym],
-                    "display_name": symbols[sym],
-                    "current_price": round(c, 2),
-                    "previous_close": round(pc, 2),
-                    "change": round(change, 2),
-                    "change_percent": round(ch, 2),
-                    "volume": int(item.get("volume", 0) or 0),
-                    "high": round(float(item.get("dayHigh", c)), 2) if item.get("dayHigh") else None,
-                    "low": round(float(item.get("dayLow", c)), 2) if item.get("dayLow") else None,
-                    "open": round(float(item.get("open", c)), 2) if item.get("open") else None,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "history": [],
-                }
-            except (TypeError, ValueError):
-                continue
-        return out
-
-    # 1. 嘗試 stable batch-index-quotes
+    # 1. v3/quote 多 symbol 批次（只回傳要的標的）；2. stable batch-index-quotes（回傳全部指數）
     for base in [
-        "https://financialmodelingprep.com/stable/batch-index-quotes",
         "https://financialmodelingprep.com/api/v3/quote/" + quote(",".join(want), safe=","),
+        "https://financialmodelingprep.com/stable/batch-index-quotes",
     ]:
         try:
-            r = requests.get(base, params={"apikey": api_key}, timeout=12)
+            r = SESSION.get(base, params={"apikey": api_key}, timeout=12)
             if r.status_code != 200:
                 continue
-            data = r.json()
-            out = _parse_response(data)
+            data = loads_json(r.content)
+            out = _parse_index_quotes(data, symbols, want, now_iso)
             if out:
                 return out
         except Exception as e:
-            print(f"FMP index quote ({base[:50]}...): {e}")
+            log.warning("FMP index quote (%s...): %s", base[:50], e)
     return {}
 
 
+@ttl_cache(ttl=3600 * 6, skip_args=1, persist="fmp_earnings")
 def get_earnings_calendar(
     api_key: str,
     from_date: str,
@@ -96,22 +118,24 @@ def get_earnings_calendar(
     """
     if not api_key or not api_key.strip():
         return {}
+    if not symbols_display:
+        return {}
     url = "https://financialmodelingprep.com/api/v3/earning_calendar"
     try:
-        r = requests.get(
+        r = SESSION.get(
             url,
             params={"from": from_date, "to": to_date, "apikey": api_key},
             timeout=15,
         )
         if r.status_code != 200:
             return {}
-        data = r.json()
+        data = loads_json(r.content)
     except Exception as e:
-        print(f"FMP earnings calendar: {e}")
+        log.warning("FMP earnings calendar: %s", e)
         return {}
     if not isinstance(data, list):
         return {}
-    today = datetime.now(timezone.utc).date()
+    today_ord = datetime.now(timezone.utc).date().toordinal()
     result = {}
     for item in data:
         if not isinstance(item, dict):
@@ -121,20 +145,20 @@ def get_earnings_calendar(
         if not sym or not d:
             continue
         # FMP 用 BRK-B，我們 key 是 BRK.B
-        sym_key = sym.replace("-", ".") if "BRK" in sym.upper() else sym
+        sym_key = sym.replace("-", ".") if sym.startswith("BRK") else sym
         if sym_key not in symbols_display:
             continue
+        d10 = str(d)[:10]
         try:
-            ed = datetime.strptime(str(d)[:10], "%Y-%m-%d").date()
-        except Exception:
+            days_until = date.fromisoformat(d10).toordinal() - today_ord
+        except ValueError:
             continue
-        days_until = (ed - today).days
         if days_until < 0:
             continue
-        if sym_key in result and result[sym_key]["date"] < str(d)[:10]:
+        if sym_key in result and result[sym_key]["date"] < d10:
             continue
         result[sym_key] = {
-            "date": str(d)[:10],
+            "date": d10,
             "days_until": days_until,
             "name": symbols_display.get(sym_key, sym_key),
         }
@@ -0,0 +1,57 @@
+"""
+共用 HTTP Session 建立（keep-alive 連線池 + 失敗重試）
+各資料源客戶端在模組層建立一個 Session 重複使用，避免每次請求重新 TCP/TLS 握手。
+"""
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson 為選用：有安裝則以其解析回應（較 stdlib json 快），否則退回 json.loads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# httpx + h2 為選用：有安裝才走 HTTP/2（同一條 TLS 連線多工多個請求）
+try:
+    import httpx
+    import h2  # noqa: F401
+except ImportError:
+    httpx = None
+
+
+def create_session(pool_maxsize: int = 32, retries: int = 2, http2: bool = False):
+    """
+    建立帶連線池與重試的 Session。
+    429 不重試，仍由呼叫端依狀態碼自行處理；重試用盡時回傳最後的回應而非丟例外。
+    http2=True 且環境有 httpx[http2] 時改回傳 httpx.Client；get/post 的用法與 requests 相同
+    （httpx 的 retries 只涵蓋連線失敗）。
+    """
+    if http2 and httpx is not None:
+        transport = httpx.HTTPTransport(
+            http2=True,
+            retries=retries,
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=pool_maxsize),
+        )
+        return httpx.Client(transport=transport, timeout=10.0, follow_redirects=True)
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def loads_json(content: bytes):
+    """解析回應 body（bytes）。格式錯誤時丟 ValueError（orjson.JSONDecodeError 亦為其子類）。"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
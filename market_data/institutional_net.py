@@ -5,13 +5,17 @@
 若證交所連線失敗（SSL、阻擋或無資料），可改用手動下載：
 至上述網頁選擇日期後點「CSV 下載」，將檔案存到 institutional_csv 資料夾，檔名 YYYYMMDD.csv
 """
-import requests
 import csv
-import time
+import re
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from market_data.http_session import create_session
 
 # 關閉 SSL 警告（部分環境對 twse.com.tw 憑證會報錯）
 try:
@@ -20,68 +24,129 @@ try:
 except Exception:
     pass
 
-SESSION = requests.Session()
+# 當年累計會並行補抓多日，連線池需容納 YTD_FETCH_WORKERS 條連線
+SESSION = create_session(pool_maxsize=16, retries=3)
 SESSION.headers.update({
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Referer': 'https://www.twse.com.tw/zh/trading/foreign/bfi82u.html',
 })
 BFI82U_URL = 'https://www.twse.com.tw/exchangeReport/BFI82U'
+# 當年累計補抓缺漏日時的並行數
+YTD_FETCH_WORKERS = 8
 
 # 專案根目錄（此檔在 market_data/ 下）
 _PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 INSTITUTIONAL_CSV_DIR = os.path.join(_PROJECT_ROOT, 'institutional_csv')
 
+# 檔名／CSV 內容中的日期格式（模組載入時編譯一次）
+_RE_ANY_8 = re.compile(r'(\d{8})')
+_RE_YMD = re.compile(r'(\d{4})[/\-]?(\d{2})[/\-]?(\d{2})')
+_RE_ROC = re.compile(r'(\d{3})/(\d{1,2})/(\d{1,2})')
+# _parse_int 一次移除千分位逗號、引號、= 與空白
+_STRIP_TBL = str.maketrans('', '', ',"= \t\r\n')
+
 # 緩存：當日內不重複拉整段區間
 _ytd_cache: Optional[Dict] = None
 _ytd_cache_date: Optional[str] = None
 # 最後一次連線錯誤（用於無資料時顯示可能原因）
 _last_fetch_error: Optional[str] = None
+# 已解析的本地 CSV（date_str -> 當日資料）；歷史日不會變，只快取成功讀到的日期
+_file_rows: Dict[str, Dict[str, int]] = {}
+_FILE_ROWS_MAX = 512
+_fetch_error_lock = threading.Lock()
+
+
+def _set_fetch_error(msg: Optional[str]) -> None:
+    global _last_fetch_error
+    with _fetch_error_lock:
+        _last_fetch_error = msg
 
 
 def _parse_int(s: str) -> int:
     """將「1,234」或「-123」轉成整數（單位：元）。"""
     if not s or not isinstance(s, str):
         return 0
-    s = s.strip().replace(',', '').replace('"', '').replace('=', '')
+    s = s.translate(_STRIP_TBL)
     try:
-        return int(float(s))
-    except (ValueError, TypeError):
-        return 0
+        return int(s)
+    except ValueError:
+        try:
+            return int(float(s))
+        except (ValueError, OverflowError):
+            return 0
 
 
 def _trading_days(start: datetime, end: datetime) -> List[datetime]:
     """產生 start~end 之間的交易日（簡單以週一～五為交易日，不排除國定假日）。"""
-    out = []
-    d = start.date()
-    end_date = end.date()
-    while d <= end_date:
-        if d.weekday() < 5:  # 0=Mon .. 4=Fri
-            out.append(datetime.combine(d, datetime.min.time()))
-        d += timedelta(days=1)
-    return out
+    dates = np.arange(start.date(), end.date() + timedelta(days=1), dtype='datetime64[D]')
+    dates = dates[np.is_busday(dates)]  # 預設週一～五
+    return [datetime.combine(d, datetime.min.time()) for d in dates.tolist()]
+
+
+def _classify_label(label: str) -> str:
+    """BFI82U 類別名稱（已去空白）歸類為 foreign／trust／dealer／total，無法歸類回傳空字串。"""
+    if ('外資' in label and ('陸資' in label or '及' in label or '與' in label)) or '外資及陸資' in label or '外資與陸資' in label:
+        return 'foreign'
+    if '投信' in label and '自營' not in label:
+        return 'trust'
+    if '自營' in label or '證券自營商' in label or '外資自營商' in label:
+        return 'dealer'
+    if '合計' in label or '總計' in label or '總和' in label or ('合' in label and '計' in label):
+        return 'total'
+    return ''
+
+
+# 類別名稱 -> 歸類；預先放入證交所常見名稱，其餘第一次遇到時以 _classify_label 判斷後存入
+_LABEL_BUCKET: Dict[str, str] = {
+    label: _classify_label(label)
+    for label in (
+        '外資及陸資', '外資及陸資(不含外資自營商)', '外資自營商',
+        '投信', '自營商', '自營商(自行買賣)', '自營商(避險)', '合計',
+    )
+}
+
+
+def _find_header_start(text: str) -> int:
+    """
+    以 str.find 定位表頭行的起始位置（找不到回傳 -1），不逐行掃描。
+    表頭為含「類別／買賣超／證券名稱」的行，或含買、賣與「買進／賣出／金額」且至少 4 欄的行（如 單位名稱,買進金額,賣出金額,買賣差額）。
+    """
+    best = -1
+    for key in ('類別', '買賣超', '證券名稱'):
+        i = text.find(key)
+        if i >= 0 and (best < 0 or i < best):
+            best = i
+    for key in ('買進', '賣出', '金額'):
+        i = text.find(key)
+        while i >= 0 and (best < 0 or i < best):
+            start = text.rfind('\n', 0, i) + 1
+            end = text.find('\n', i)
+            if end < 0:
+                end = len(text)
+            line = text[start:end]
+            # 表頭欄位不含千分位逗號，以逗號數判斷欄數
+            if '買' in line and '賣' in line and line.count(',') >= 3:
+                best = i
+                break
+            i = text.find(key, end)
+    if best < 0:
+        return -1
+    return text.rfind('\n', 0, best) + 1
 
 
 def _parse_bfi82u_csv(text: str, date_str: str) -> Optional[Dict[str, int]]:
     """解析 BFI82U CSV 內容（API 或本地檔），回傳該日外資與三大法人合計買賣超（元）。"""
-    if not text or 'html' in text.lower()[:200]:
+    if not text or 'html' in text[:200].lower():
         return None
     text = text.lstrip('\ufeff')
-    lines = [line for line in text.split('\n') if line.strip()]
-    if len(lines) < 3:
+    header_start = _find_header_start(text)
+    if header_start < 0:
         return None
-    header_idx = None
-    for i, line in enumerate(lines):
-        if '類別' in line or '買賣超' in line or '證券名稱' in line:
-            header_idx = i
-            break
-        if '買' in line and '賣' in line and ('買進' in line or '賣出' in line or '金額' in line) and ',' in line:
-            row_pre = next(csv.reader(StringIO(line)))
-            if len(row_pre) >= 4:
-                header_idx = i
-                break
-    if header_idx is None:
+    lines = [line for line in text[header_start:].split('\n') if line.strip()]
+    if len(lines) < 2:
         return None
-    reader = csv.reader(StringIO('\n'.join(lines[header_idx:])))
+    # csv.reader 可直接吃行列表，不必再 join 成整段字串
+    reader = csv.reader(lines)
     header = next(reader)
     col_idx = None
     for j, h in enumerate(header):
@@ -105,16 +170,19 @@ def _parse_bfi82u_csv(text: str, date_str: str) -> Optional[Dict[str, int]]:
             continue
         label = (row[category_col] or '').strip().replace(' ', '')
         value = _parse_int(row[col_idx]) if col_idx < len(row) else 0
-        if ('外資' in label and ('陸資' in label or '及' in label or '與' in label)) or '外資及陸資' in label or '外資與陸資' in label:
+        bucket = _LABEL_BUCKET.get(label)
+        if bucket is None:
+            bucket = _LABEL_BUCKET[label] = _classify_label(label)
+        if bucket == 'foreign':
             foreign_net = value
             components.append(value)
-        elif '投信' in label and '自營' not in label:
+        elif bucket == 'trust':
             trust_net = value
             components.append(value)
-        elif '自營' in label or '證券自營商' in label or '外資自營商' in label:
+        elif bucket == 'dealer':
             dealer_net = (dealer_net or 0) + value
             components.append(value)
-        elif '合計' in label or '總計' in label or '總和' in label or ('合' in label and '計' in label):
+        elif bucket == 'total':
             total_net = value
     if total_net is None and components:
         total_net = sum(components)
@@ -139,8 +207,8 @@ def fetch_bfi82u_day(date: datetime) -> Optional[Dict[str, int]]:
     """
     取得單日 BFI82U 報表（證交所 API），回傳該日外資與三大法人合計買賣超（元）。
     若連線失敗或解析失敗會設定 _last_fetch_error 並回傳 None。
+    解析成功時原始 CSV 另存到 institutional_csv/YYYYMMDD.csv，之後由本地檔讀取、不再重抓。
     """
-    global _last_fetch_error
     date_str = date.strftime('%Y%m%d')
     try:
         r = SESSION.get(
@@ -150,56 +218,76 @@ def fetch_bfi82u_day(date: datetime) -> Optional[Dict[str, int]]:
             verify=False
         )
         r.raise_for_status()
-        text = r.text
+        raw = r.content
     except Exception as e:
-        _last_fetch_error = str(e)
+        _set_fetch_error(str(e))
         return None
-    if not text or 'html' in text.lower()[:200]:
-        _last_fetch_error = '證交所未回傳 CSV（可能為非交易日或網站阻擋）'
+    # 直接解碼原始 bytes，不經 r.text 的編碼偵測
+    if not raw or b'html' in raw[:200].lower():
+        _set_fetch_error('證交所未回傳 CSV（可能為非交易日或網站阻擋）')
         return None
+    text = _decode_csv_bytes(raw)
     parsed = _parse_bfi82u_csv(text, date_str)
     if parsed is None:
-        _last_fetch_error = '證交所回傳內容無法解析（非預期 CSV 格式）'
+        _set_fetch_error('證交所回傳內容無法解析（非預期 CSV 格式）')
         return None
-    _last_fetch_error = None
+    _set_fetch_error(None)
+    try:
+        _write_csv(date_str, raw)
+        _remember_file_row(date_str, parsed)
+    except OSError:
+        pass
     return parsed
 
 
 def list_uploaded_dates() -> List[str]:
     """掃描 institutional_csv 資料夾，回傳已有 CSV 的日期列表（YYYYMMDD），已排序。"""
-    import re
     if not os.path.isdir(INSTITUTIONAL_CSV_DIR):
         return []
-    dates = []
-    for name in os.listdir(INSTITUTIONAL_CSV_DIR):
-        if not name.lower().endswith('.csv'):
-            continue
-        base = name[:-4]  # 去掉 .csv
-        # 支援 YYYYMMDD 或 BFI82U_YYYYMMDD
-        m = re.match(r'^(?:BFI82U_)?(\d{8})$', base)
-        if m:
-            dates.append(m.group(1))
-    return sorted(set(dates))
+    dates = set()
+    with os.scandir(INSTITUTIONAL_CSV_DIR) as it:
+        for entry in it:
+            name = entry.name
+            if len(name) < 12 or not name.lower().endswith('.csv'):
+                continue
+            base = name[:-4]  # 去掉 .csv
+            # 支援 YYYYMMDD 或 BFI82U_YYYYMMDD
+            if len(base) == 8 or (len(base) == 15 and base.startswith('BFI82U_')):
+                cand = base[-8:]
+                if cand.isdecimal():
+                    dates.add(cand)
+    return sorted(dates)
 
 
-def save_uploaded_csv(date_str: str, content: bytes) -> None:
-    """將上傳的 CSV 存到 institutional_csv/YYYYMMDD.csv，並清除快取。"""
-    global _ytd_cache, _ytd_cache_date
+def _write_csv(date_str: str, content: bytes) -> None:
+    """寫入 institutional_csv/YYYYMMDD.csv（不清除快取）。"""
     os.makedirs(INSTITUTIONAL_CSV_DIR, exist_ok=True)
     path = os.path.join(INSTITUTIONAL_CSV_DIR, f'{date_str}.csv')
     with open(path, 'wb') as f:
         f.write(content)
+
+
+def _remember_file_row(date_str: str, row: Dict[str, int]) -> None:
+    if len(_file_rows) >= _FILE_ROWS_MAX:
+        _file_rows.clear()
+    _file_rows[date_str] = row
+
+
+def save_uploaded_csv(date_str: str, content: bytes) -> None:
+    """將上傳的 CSV 存到 institutional_csv/YYYYMMDD.csv，並清除快取。"""
+    global _ytd_cache, _ytd_cache_date
+    _write_csv(date_str, content)
+    _file_rows.pop(date_str, None)
     _ytd_cache = None
     _ytd_cache_date = None
 
 
 def try_parse_date_from_filename(filename: str) -> Optional[str]:
     """從檔名嘗試解析日期，例如 BFI82U_day_20260102.csv、20260102.csv。回傳 YYYYMMDD。"""
-    import re
     if not filename:
         return None
     base = os.path.splitext(filename)[0]
-    m = re.search(r'(\d{8})', base)
+    m = _RE_ANY_8.search(base)
     if m:
         s = m.group(1)
         y, mon, d = int(s[:4]), int(s[4:6]), int(s[6:8])
@@ -210,38 +298,48 @@ def try_parse_date_from_filename(filename: str) -> Optional[str]:
 
 def try_parse_date_from_csv(text: str) -> Optional[str]:
     """從 BFI82U CSV 內容嘗試解析日期，回傳 YYYYMMDD 或 None。"""
-    import re
     # 常見：資料日期 20260102、或 115/01/02（民國）
     for line in text.split('\n')[:10]:
         line = line.strip()
-        m = re.search(r'(\d{4})[/\-]?(\d{2})[/\-]?(\d{2})', line)
+        m = _RE_YMD.search(line)
         if m:
             return m.group(1) + m.group(2) + m.group(3)
-        m = re.search(r'(\d{3})/(\d{1,2})/(\d{1,2})', line)  # 民國 115/1/2
+        m = _RE_ROC.search(line)  # 民國 115/1/2
         if m:
             y = int(m.group(1)) + 1911
             return f'{y}{int(m.group(2)):02d}{int(m.group(3)):02d}'
     return None
 
 
+def _decode_csv_bytes(raw: bytes) -> str:
+    """BOM 開頭為 UTF-8；否則先試嚴格 UTF-8（Big5 內容幾乎不會是合法 UTF-8），失敗再以 cp950（Big5 超集）解碼。"""
+    if raw.startswith(b'\xef\xbb\xbf'):
+        return raw[3:].decode('utf-8', errors='replace')
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('cp950', errors='replace')
+
+
 def _load_bfi82u_from_file(date_str: str) -> Optional[Dict[str, int]]:
-    """從 institutional_csv/ 讀取手動下載的 BFI82U CSV，檔名 YYYYMMDD.csv 或 BFI82U_YYYYMMDD.csv。證交所多為 Big5，先試 Big5 再試 UTF-8。"""
+    """從 institutional_csv/ 讀取手動下載的 BFI82U CSV，檔名 YYYYMMDD.csv 或 BFI82U_YYYYMMDD.csv。證交所多為 Big5，另支援 UTF-8（含 BOM）。"""
+    cached = _file_rows.get(date_str)
+    if cached is not None:
+        return cached
     for name in (f'{date_str}.csv', f'BFI82U_{date_str}.csv'):
         path = os.path.join(INSTITUTIONAL_CSV_DIR, name)
         if not os.path.isfile(path):
             continue
-        text = None
-        for encoding in ('cp950', 'big5', 'utf-8', 'utf-8-sig'):
-            try:
-                with open(path, 'r', encoding=encoding) as f:
-                    text = f.read()
-                break
-            except (UnicodeDecodeError, UnicodeError):
-                continue
+        try:
+            with open(path, 'rb') as f:
+                text = _decode_csv_bytes(f.read())
+        except OSError:
+            continue
         if not text:
             continue
         parsed = _parse_bfi82u_csv(text, date_str)
         if parsed:
+            _remember_file_row(date_str, parsed)
             return parsed
     return None
 
@@ -261,49 +359,45 @@ def get_institutional_net_ytd(force_refresh: bool = False) -> Dict:
     end = now
     days = _trading_days(year_start, end)
 
-    daily_list: List[Dict] = []
-    cumulative_total = 0
-    cumulative_foreign = 0
-    cumulative_trust = 0
-    cumulative_dealer = 0
-
-    for i, d in enumerate(days):
-        date_str = d.strftime('%Y%m%d')
-        row = _load_bfi82u_from_file(date_str)
-        if row is None:
-            if i > 0:
-                time.sleep(0.2)
-            row = fetch_bfi82u_day(d)
-        if row is None:
-            continue
+    # 先讀本地 CSV，缺的日期再並行向證交所抓取；累計須依日期順序，合併後再逐日計算
+    rows = [_load_bfi82u_from_file(d.strftime('%Y%m%d')) for d in days]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(YTD_FETCH_WORKERS, len(missing))) as executor:
+            for i, row in zip(missing, executor.map(fetch_bfi82u_day, [days[i] for i in missing])):
+                rows[i] = row
+
+    # 每列：外資、投信、自營商、合計；累計與換算百萬元一次以 NumPy 整欄計算
+    rows = [row for row in rows if row is not None]
+    nets = np.zeros((len(rows), 4), dtype=np.int64)
+    for k, row in enumerate(rows):
         f_net = row.get('foreign_net') or 0
         tr_net = row.get('trust_net') or 0
         dl_net = row.get('dealer_net') or 0
         t_net = row.get('total_net')
         if t_net is None:
             t_net = f_net + tr_net + dl_net
-        cumulative_foreign += f_net
-        cumulative_trust += tr_net
-        cumulative_dealer += dl_net
-        cumulative_total += t_net
-        daily_list.append({
+        nets[k] = (f_net, tr_net, dl_net, t_net)
+    cum = nets.cumsum(axis=0)
+    cum_foreign_millions, cum_trust_millions, cum_dealer_millions, cum_total_millions = (
+        np.round(cum / 1e6, 2).T.tolist()
+    )
+    labels = [f"{row['date'][:4]}-{row['date'][4:6]}-{row['date'][6:8]}" for row in rows]
+    daily_list: List[Dict] = [
+        {
             'date': row['date'],
-            'date_display': f"{row['date'][:4]}-{row['date'][4:6]}-{row['date'][6:8]}",
-            'foreign_net': f_net,
-            'trust_net': tr_net,
-            'dealer_net': dl_net,
-            'total_net': t_net,
-            'cumulative_foreign': cumulative_foreign,
-            'cumulative_trust': cumulative_trust,
-            'cumulative_dealer': cumulative_dealer,
-            'cumulative_total': cumulative_total,
-        })
-
-    labels = [x['date_display'] for x in daily_list]
-    cum_total_millions = [round(x['cumulative_total'] / 1e6, 2) for x in daily_list]
-    cum_foreign_millions = [round(x['cumulative_foreign'] / 1e6, 2) for x in daily_list]
-    cum_trust_millions = [round(x['cumulative_trust'] / 1e6, 2) for x in daily_list]
-    cum_dealer_millions = [round(x['cumulative_dealer'] / 1e6, 2) for x in daily_list]
+            'date_display': label,
+            'foreign_net': n[0],
+            'trust_net': n[1],
+            'dealer_net': n[2],
+            'total_net': n[3],
+            'cumulative_foreign': c[0],
+            'cumulative_trust': c[1],
+            'cumulative_dealer': c[2],
+            'cumulative_total': c[3],
+        }
+        for row, label, n, c in zip(rows, labels, nets.tolist(), cum.tolist())
+    ]
 
     result = {
         'labels': labels,
@@ -0,0 +1,46 @@
+"""
+資料源客戶端用的限流 logger
+供應商故障時每個 symbol 都會失敗，逐筆 print 會一次刷出數百行；改以訊息樣板為鍵，每鍵每 60 秒最多輸出一次。
+"""
+import logging
+import threading
+import time
+from typing import Dict, Tuple
+
+
+class RateLimitFilter(logging.Filter):
+    """同一 (logger, 訊息樣板) 在 interval 秒內只放行一次，下次放行時附上被略過的次數"""
+
+    def __init__(self, interval: float = 60.0):
+        super().__init__()
+        self.interval = interval
+        self._seen: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (0.0, 0))
+            if last and now - last < self.interval:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (前 {int(self.interval)} 秒內另有 {suppressed} 筆同類訊息略過)"
+        return True
+
+
+_handler = logging.StreamHandler()
+_handler.setFormatter(logging.Formatter('%(name)s: %(message)s'))
+_handler.addFilter(RateLimitFilter())
+
+
+def get_logger(name: str) -> logging.Logger:
+    """取得掛上共用限流 handler 的 logger（不往 root 傳遞，避免重複輸出）"""
+    log = logging.getLogger(name)
+    if _handler not in log.handlers:
+        log.addHandler(_handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    return log
@@ -0,0 +1,53 @@
+"""
+執行緒安全的節流器
+資料源有「每分鐘 N 次」限制時使用：額度內的請求可同時發出，超過才等待。
+TokenBucket 以平均速率補充；SlidingWindowLimiter 保證任一 period 秒內不超過 max_calls 次。
+"""
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """每秒補充 rate 個 token，最多累積 capacity 個；acquire() 取不到時阻塞等待"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            wait = (1 - self._tokens) / self.rate
+            # 持鎖等待，讓後到的請求依序排隊
+            time.sleep(wait)
+            self._last = time.monotonic()
+            self._tokens = 0
+
+
+class SlidingWindowLimiter:
+    """任一連續 period 秒內最多放行 max_calls 次（記錄最近 max_calls 次的發送時間）；acquire() 超過時阻塞等待"""
+
+    def __init__(self, max_calls: int, period: float):
+        self.max_calls = max_calls
+        self.period = period
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if len(self._sent) >= self.max_calls:
+                wait = self.period - (time.monotonic() - self._sent[0])
+                if wait > 0:
+                    # 持鎖等待，讓後到的請求依序排隊
+                    time.sleep(wait)
+                self._sent.popleft()
+            self._sent.append(time.monotonic())
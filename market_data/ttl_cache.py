@@ -0,0 +1,149 @@
+"""
+資料源客戶端用的 TTL 快取（記憶體 + 選擇性寫入磁碟）
+報價類 15 秒、財報行事曆 6 小時；財報行事曆另存到 ~/.cache/trading_system，程序重啟後仍可命中。
+"""
+import functools
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'trading_system')
+
+
+def _freeze(value: Any) -> Any:
+    """將 dict/list 參數轉成可 hash 的 tuple，作為快取鍵的一部分"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    """None、空 dict/list 視為空；pandas 物件看 .empty（其 bool() 會丟例外）"""
+    if value is None:
+        return True
+    empty = getattr(value, 'empty', None)
+    if isinstance(empty, bool):
+        return empty
+    return not value
+
+
+class TTLCache:
+    """
+    執行緒安全的 key -> (寫入時間, 值) 快取，過期即視為不存在。
+    maxsize 指定時為 LRU：超過上限先淘汰最久未使用的鍵。
+    """
+
+    def __init__(self, ttl: float, maxsize: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Any, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            if time.time() - hit[0] >= self.ttl:
+                del self._data[key]
+                return None
+            if self.maxsize:
+                self._data.move_to_end(key)
+            return hit[1]
+
+    def set(self, key: Any, value: Any, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (stored_at or time.time(), value)
+            if self.maxsize:
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def _disk_path(persist: str, key: Any) -> str:
+    digest = hashlib.md5(repr(key).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f'{persist}_{digest}.json')
+
+
+def _load_from_disk(path: str, ttl: float) -> Optional[Tuple[float, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        stored_at = float(payload['stored_at'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if time.time() - stored_at >= ttl:
+        return None
+    return stored_at, payload.get('value')
+
+
+def _save_to_disk(path: str, value: Any) -> None:
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'stored_at': time.time(), 'value': value}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def ttl_cache(ttl: float, skip_args: int = 0, persist: Optional[str] = None,
+              ignore: Iterable[str] = ()) -> Callable:
+    """
+    以 TTL 快取函式結果（None 或空結果不快取，失敗時下次會重試）。
+    skip_args: 前幾個位置參數不列入快取鍵（如 api_key）
+    ignore: 不列入快取鍵的關鍵字參數（如 now_iso）
+    persist: 指定時同步寫入 CACHE_DIR/{persist}_{hash}.json（值須可 JSON 序列化）
+    被裝飾的函式附帶 cache_clear()：清空記憶體快取並刪除 persist 檔，供強制刷新時使用。
+    """
+    ignored = frozenset(ignore)
+
+    def decorator(func: Callable) -> Callable:
+        cache = TTLCache(ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key_kwargs = {k: v for k, v in kwargs.items() if k not in ignored} if ignored else kwargs
+            key = (_freeze(args[skip_args:]), _freeze(key_kwargs))
+            value = cache.get(key)
+            if value is not None:
+                return value
+            path = _disk_path(persist, key) if persist else None
+            if path:
+                hit = _load_from_disk(path, ttl)
+                if hit is not None and not _is_empty(hit[1]):
+                    cache.set(key, hit[1], stored_at=hit[0])
+                    return hit[1]
+            value = func(*args, **kwargs)
+            if not _is_empty(value):
+                cache.set(key, value)
+                if path:
+                    _save_to_disk(path, value)
+            return value
+
+        def cache_clear() -> None:
+            cache.clear()
+            if persist:
+                for path in glob.glob(os.path.join(CACHE_DIR, f'{persist}_*.json')):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+        wrapper.cache = cache
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
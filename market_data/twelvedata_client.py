@@ -2,14 +2,22 @@
 Twelve Data 貴金屬報價（期貨/現貨對應）、歷史序列
 免費 8 次/分、800 次/日，需 API key：TWELVEDATA_API_KEY
 """
-import os
-import time
 from typing import Dict, Optional
 from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 import pandas as pd
 
+from market_data.http_session import create_session, loads_json
+from market_data.log_util import get_logger
+from market_data.rate_limit import SlidingWindowLimiter
+from market_data.ttl_cache import ttl_cache
+
+log = get_logger(__name__)
+SESSION = create_session(pool_maxsize=16, retries=3)
+# 免費方案 8 次/分（get_quote 與 fetch_time_series 共用）：任一 60 秒內最多 8 次，額度內可同時發出，超過才等待
+_BUCKET = SlidingWindowLimiter(max_calls=8, period=60.0)
+
 # Config 代碼（Yahoo 風格）-> Twelve Data 代碼（commodities / crypto）
 METALS_SYMBOL_MAP = {
     "GC=F": "XAU/USD",
@@ -33,6 +41,7 @@ def _to_twelvedata_symbol(config_symbol: str) -> Optional[str]:
     return CRYPTO_SYMBOL_MAP.get(config_symbol)
 
 
+@ttl_cache(ttl=86400, skip_args=1)
 def fetch_time_series(
     api_key: str,
     config_symbol: str,
@@ -53,8 +62,9 @@ def fetch_time_series(
         start = end - timedelta(days=365 * 15)  # 加密約 15 年
     else:
         start = end - timedelta(days=365 * 20)
+    _BUCKET.acquire()
     try:
-        r = requests.get(
+        r = SESSION.get(
             "https://api.twelvedata.com/time_series",
             params={
                 "symbol": td_symbol,
@@ -69,53 +79,43 @@ def fetch_time_series(
         if r.status_code == 429:
             return None
         r.raise_for_status()
-        data = r.json()
+        data = loads_json(r.content)
     except Exception as e:
-        print(f"TwelveData time_series {config_symbol}: {e}")
+        log.warning("TwelveData time_series %s: %s", config_symbol, e)
         return None
     vals = data.get("values") if isinstance(data, dict) else None
     if not vals or not isinstance(vals, list):
         return None
-    rows = []
-    for v in vals:
-        if not isinstance(v, dict):
-            continue
-        dt_str = v.get("datetime")
-        close_str = v.get("close")
-        if not dt_str or not close_str:
-            continue
-        try:
-            dt = pd.to_datetime(dt_str).date()
-            close = float(close_str)
-        except (ValueError, TypeError):
-            continue
-        rows.append((dt, close))
-    if not rows:
+    df = pd.DataFrame.from_records([v for v in vals if isinstance(v, dict)], columns=["datetime", "close"])
+    # interval=1day 固定回傳 YYYY-MM-DD，指定格式避免逐筆推斷
+    df["date"] = pd.to_datetime(df["datetime"], format="%Y-%m-%d", cache=True, errors="coerce")
+    df["close"] = pd.to_numeric(df["close"], errors="coerce")
+    df = df.dropna(subset=["date", "close"])
+    if df.empty:
         return None
-    df = pd.DataFrame(rows, columns=["date", "close"])
     df = df.drop_duplicates(subset=["date"]).sort_values("date")
-    # 免費方案 8 次/分，避免連續請求
-    time.sleep(8)
-    return pd.Series(df["close"].values, index=pd.DatetimeIndex(df["date"]))
+    return pd.Series(df["close"].to_numpy(), index=pd.DatetimeIndex(df["date"].to_numpy()))
 
 
+@ttl_cache(ttl=60, skip_args=1)
 def get_quote(api_key: str, symbol_twelve: str) -> Optional[Dict]:
     """單一標的報價。symbol_twelve 如 XAU/USD。回傳為通用欄位，不含 symbol/name。"""
     if not api_key or not api_key.strip():
         return None
+    _BUCKET.acquire()
     try:
-        r = requests.get(
+        r = SESSION.get(
             "https://api.twelvedata.com/quote",
             params={"symbol": symbol_twelve, "apikey": api_key},
             timeout=10,
         )
         if r.status_code == 429:
-            print(f"Twelve Data rate limit (429) for {symbol_twelve}, skip.")
+            log.warning("Twelve Data rate limit (429) for %s, skip.", symbol_twelve)
             return None
         r.raise_for_status()
-        data = r.json()
+        data = loads_json(r.content)
     except Exception as e:
-        print(f"Twelve Data quote {symbol_twelve}: {e}")
+        log.warning("Twelve Data quote %s: %s", symbol_twelve, e)
         return None
     if not isinstance(data, dict):
         return None
@@ -131,15 +131,17 @@ def get_quote(api_key: str, symbol_twelve: str) -> Optional[Dict]:
         return None
     change = close - open_p
     change_percent = (change / open_p * 100) if open_p else 0
+    # 前端以 toLocaleString() 顯示、不另行四捨五入，故仍在此取 2 位；open 與 previous_close 同值只算一次
+    open_r = round(open_p, 2)
     return {
         "current_price": round(close, 2),
-        "previous_close": round(open_p, 2),
+        "previous_close": open_r,
         "change": round(change, 2),
         "change_percent": round(change_percent, 2),
         "volume": int(vol),
         "high": round(high, 2),
         "low": round(low, 2),
-        "open": round(open_p, 2),
+        "open": open_r,
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "history": [],
     }
@@ -148,25 +150,24 @@ def get_quote(api_key: str, symbol_twelve: str) -> Optional[Dict]:
 def get_multiple_metals(
     api_key: str,
     symbols_display: Dict[str, str],
-    delay_seconds: float = 8.0,
 ) -> Dict[str, Dict]:
     """
     symbols_display: Config.METALS_FUTURES 格式 { 'GC=F': '黃金期貨', ... }
-    依序請求，遵守 8 次/分。
+    並行請求，由 _BUCKET 控制在 8 次/分內。
     回傳 { 'GC=F': { ...market_data, symbol, name, display_name }, ... }
     """
     if not api_key or not symbols_display:
         return {}
+    keys = [k for k in symbols_display if k in METALS_SYMBOL_MAP]
+    if not keys:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(keys))) as executor:
+        results = dict(zip(keys, executor.map(lambda k: get_quote(api_key, METALS_SYMBOL_MAP[k]), keys)))
     out = {}
-    for config_key, display_name in symbols_display.items():
-        sym_twelve = METALS_SYMBOL_MAP.get(config_key)
-        if not sym_twelve:
-            continue
-        data = get_quote(api_key, sym_twelve)
+    for config_key in keys:
+        data = results.get(config_key)
         if data:
-            data["symbol"] = config_key
-            data["name"] = display_name
-            data["display_name"] = display_name
-            out[config_key] = data
-        time.sleep(delay_seconds)
+            display_name = symbols_display[config_key]
+            # data 可能是 ttl_cache 內的物件，輸出時另建 dict，不改動快取
+            out[config_key] = {**data, "symbol": config_key, "name": display_name, "display_name": display_name}
     return out
@@ -0,0 +1,122 @@
+"""
+Yahoo Finance 批次報價（v7/finance/quote，一次請求多個標的）
+取代 market summary 熱路徑上「每檔 yfinance 三次請求」；history／財報日仍由 yfinance 處理。
+"""
+import threading
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
+
+import requests
+
+from market_data.log_util import get_logger
+
+log = get_logger(__name__)
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+COOKIE_URL = "https://fc.yahoo.com"
+# 每次請求最多幾個 symbol
+BATCH_SIZE = 50
+
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+})
+
+# Yahoo 要求 cookie + crumb，取得一次後重用；401 時重新取得
+_crumb: Optional[str] = None
+_crumb_lock = threading.Lock()
+
+
+def _get_crumb(refresh: bool = False) -> Optional[str]:
+    global _crumb
+    with _crumb_lock:
+        if _crumb and not refresh:
+            return _crumb
+        try:
+            SESSION.get(COOKIE_URL, timeout=10)  # 只為取得 cookie，回應狀態不重要
+            r = SESSION.get(CRUMB_URL, timeout=10)
+            if r.status_code != 200 or not r.text or "<" in r.text:
+                _crumb = None
+            else:
+                _crumb = r.text.strip()
+        except Exception as e:
+            log.warning("Yahoo crumb: %s", e)
+            _crumb = None
+        return _crumb
+
+
+def _request_batch(symbols: List[str]) -> List[Dict]:
+    crumb = _get_crumb()
+    for attempt in range(2):
+        params = {"symbols": ",".join(symbols)}
+        if crumb:
+            params["crumb"] = crumb
+        try:
+            r = SESSION.get(QUOTE_URL, params=params, timeout=12)
+        except Exception as e:
+            log.warning("Yahoo quote batch: %s", e)
+            return []
+        if r.status_code == 401 and attempt == 0:
+            crumb = _get_crumb(refresh=True)
+            continue
+        if r.status_code != 200:
+            return []
+        try:
+            data = r.json()
+        except ValueError:
+            return []
+        items = ((data or {}).get("quoteResponse") or {}).get("result")
+        return items if isinstance(items, list) else []
+    return []
+
+
+def _parse_quote(item: Dict, now_iso: str) -> Optional[Dict]:
+    """轉成與 data_fetcher.get_market_data 相容的格式（history 為空）。"""
+    symbol = item.get("symbol")
+    price = item.get("regularMarketPrice")
+    if not symbol or price is None:
+        return None
+    try:
+        current = float(price)
+        prev = item.get("regularMarketPreviousClose")
+        prev = float(prev) if prev is not None else current
+    except (TypeError, ValueError):
+        return None
+    change = current - prev if prev else 0
+    change_percent = (change / prev * 100) if prev else 0
+    o = item.get("regularMarketOpen")
+    h = item.get("regularMarketDayHigh")
+    lo = item.get("regularMarketDayLow")
+    v = item.get("regularMarketVolume") or 0
+    return {
+        "symbol": symbol,
+        "name": item.get("longName") or item.get("shortName") or symbol,
+        "current_price": round(current, 2),
+        "previous_close": round(prev, 2),
+        "change": round(change, 2),
+        "change_percent": round(change_percent, 2),
+        "volume": int(v),
+        "high": round(float(h), 2) if h else round(current, 2),
+        "low": round(float(lo), 2) if lo else round(current, 2),
+        "open": round(float(o), 2) if o else round(current, 2),
+        "timestamp": now_iso,
+        "history": [],
+    }
+
+
+def get_multiple_quotes(symbols: List[str]) -> Dict[str, Dict]:
+    """
+    批次取得多個標的報價，每 BATCH_SIZE 個一次 HTTP 請求。
+    回傳 { symbol: { ...market_data }, ... }；取不到的標的不在結果內（由呼叫端 fallback）。
+    """
+    out = {}
+    now_iso = datetime.now(timezone.utc).isoformat()
+    for i in range(0, len(symbols), BATCH_SIZE):
+        for item in _request_batch(symbols[i:i + BATCH_SIZE]):
+            if not isinstance(item, dict):
+                continue
+            d = _parse_quote(item, now_iso)
+            if d:
+                out[d["symbol"]] = d
+    return out
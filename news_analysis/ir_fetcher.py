@@ -3,13 +3,44 @@
 從本地CSV文件讀取法說會資料（用戶需手動下載）
 """
 import csv
+import hashlib
+import io
+import mmap
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-import time
+import pickle
+import re
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import pytz
+import pandas as pd
 from pathlib import Path
 
+from market_data.ttl_cache import TTLCache
+
+# 台灣無日光節約時間，解析日期時直接用固定 UTC+8，不經 pytz localize
+TAIWAN_TZ = timezone(timedelta(hours=8))
+# CSV 表頭關鍵字（公司代號、公司名稱、召開法人說明會日期…）
+_HEADER_RE = re.compile(r'公司代號|公司名稱|召開')
+# 日期格式 年/月/日（民國或西元年），先以正則驗證，避免對格式錯誤的欄位靠例外處理
+_DATE_RE = re.compile(r'^(\d+)/(\d+)/(\d+)$')
+# 磁碟快取格式版本（資料列結構變更時遞增，舊快取自動失效）
+_PARSED_CACHE_VERSION = 3
+# 超過此大小的 CSV 以 mmap 直接解碼，省去整檔複製成 bytes 的一次拷貝
+_MMAP_THRESHOLD = 4 << 20
+
+
+class IRMeetingRow(NamedTuple):
+    """CSV 中一筆已解析的法說會資料（長駐快取用 tuple，比 dict 省記憶體）"""
+    company_code: str
+    company_name: str
+    meeting_date: datetime
+    meeting_date_iso: str  # YYYY-MM-DD，供按日期分組
+    meeting_time: str
+    location: str
+
+
 class IRFetcher:
     """法人說明會數據獲取器（從本地CSV文件）"""
     
@@ -20,9 +51,9 @@ class IRFetcher:
         Args:
             csv_dir: CSV文件目錄路徑，默認為項目根目錄下的 'ir_csv' 文件夾
         """
-        self.cache = {}
-        self.cache_time = {}
         self.cache_duration = 3600  # 緩存1小時
+        # 查詢結果快取（年/月/市場 -> 法說會列表），有上限的 LRU + TTL
+        self.cache = TTLCache(ttl=self.cache_duration, maxsize=128)
         self.taiwan_tz = pytz.timezone('Asia/Taipei')
         
         # 設置CSV文件目錄
@@ -35,14 +66,15 @@ class IRFetcher:
         
         # 確保目錄存在
         self.csv_dir.mkdir(exist_ok=True)
+        # CSV 檔案列表快取：(目錄 mtime_ns, 依修改時間排序的檔案)
+        self._dir_cache = None
+        # 年月 -> CSV 檔案 索引：(目錄 mtime_ns, {(西元年, 月): 路徑})
+        self._file_index = None
+        # _find_csv_file 結果：(目錄 mtime_ns, {(民國年, 月, 市場): 路徑})
+        self._find_cache = (None, {})
+        # 已解析的 CSV：路徑 -> (檔案 mtime_ns, 全部有效資料列, 是否已按日期排序)
+        self._file_rows = {}
         
-    def _is_cache_valid(self, key: str) -> bool:
-        """檢查緩存是否有效"""
-        if key not in self.cache_time:
-            return False
-        elapsed = time.time() - self.cache_time[key]
-        return elapsed < self.cache_duration
-    
     def _parse_ir_date(self, date_str: str, roc_year: int) -> Optional[datetime]:
         """解析法說會日期（可能是民國年格式）"""
         if not date_str or date_str.strip() == '':
@@ -56,36 +88,124 @@ class IRFetcher:
             date_str = date_str.split('至')[0].split('~')[0].split(' ')[0].strip()
         
         # 處理民國年格式 (例如: 115/01/28)
-        if '/' in date_str and len(date_str.split('/')) == 3:
-            parts = date_str.split('/')
-            try:
-                year_part = int(parts[0])
-                month_part = int(parts[1])
-                day_part = int(parts[2])
-                
-                # 判斷是否為民國年
-                # 民國年通常在 100-200 之間（對應 2011-2111 年）
-                # 如果年份在 100-200 之間，視為民國年
-                if 100 <= year_part <= 200:
-                    # 民國年轉西元年：民國年 + 1911 = 西元年
-                    year = year_part + 1911
-                elif year_part < 100:
-                    # 小於100也可能是民國年（例如：99年 = 2010年）
-                    year = year_part + 1911
-                else:
-                    # 大於200，視為西元年
-                    year = year_part
-                
-                dt = datetime(year, month_part, day_part)
-                return self.taiwan_tz.localize(dt)
-            except:
-                pass
+        m = _DATE_RE.match(date_str)
+        if not m:
+            return None
+        year_part, month_part, day_part = map(int, m.groups())
+        
+        # 判斷是否為民國年
+        # 民國年通常在 100-200 之間（對應 2011-2111 年）
+        # 如果年份在 100-200 之間，視為民國年
+        if 100 <= year_part <= 200:
+            # 民國年轉西元年：民國年 + 1911 = 西元年
+            year = year_part + 1911
+        elif year_part < 100:
+            # 小於100也可能是民國年（例如：99年 = 2010年）
+            year = year_part + 1911
+        else:
+            # 大於200，視為西元年
+            year = year_part
         
-        return None
+        try:
+            return datetime(year, month_part, day_part, tzinfo=TAIWAN_TZ)
+        except ValueError:
+            # 格式正確但日期不存在（如 115/02/30）
+            return None
+    
+    def _list_csv_files(self) -> List[Path]:
+        """
+        列出目錄內的 CSV 檔案（最新修改的在前）。
+        以目錄 mtime 為鍵快取，目錄內新增/刪除/改名檔案時才重新掃描。
+        """
+        try:
+            dir_mtime = self.csv_dir.stat().st_mtime_ns
+        except OSError:
+            return []
+        if self._dir_cache is not None and self._dir_cache[0] == dir_mtime:
+            return self._dir_cache[1]
+        entries = []
+        with os.scandir(self.csv_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.csv') and entry.is_file():
+                    entries.append((entry.stat().st_mtime, Path(entry.path)))
+        entries.sort(key=lambda e: e[0], reverse=True)
+        csv_files = [p for _, p in entries]
+        self._dir_cache = (dir_mtime, csv_files)
+        return csv_files
+    
+    def _parse_ir_date_series(self, series: pd.Series) -> pd.Series:
+        """_parse_ir_date 的整欄版本：回傳帶台北時區的日期，無法解析者為 NaT。"""
+        if series.empty:
+            return pd.Series([], dtype=object)
+        s = series.fillna('').astype(str).str.strip()
+        # 處理日期範圍（例如: 115/01/13 至 115/01/20），取第一個日期
+        s = s.str.split(r'[至~ ]', n=1, regex=True).str[0].str.strip()
+        parts = s.str.extract(_DATE_RE).astype(float)
+        # 200 以下（含小於 100）視為民國年，其餘為西元年
+        year = parts[0].where(parts[0] > 200, parts[0] + 1911)
+        dates = pd.to_datetime(
+            pd.DataFrame({'year': year, 'month': parts[1], 'day': parts[2]}),
+            errors='coerce',
+        )
+        return dates.dt.tz_localize(TAIWAN_TZ)
+    
+    def _get_file_index(self, csv_files: List[Path]) -> Dict:
+        """
+        建立 (西元年, 月) -> CSV 檔案 的索引：讀每個檔案開頭（前 21 列）日期欄出現的年月。
+        csv_files 為最新在前，同一年月保留最新的檔案；以目錄 mtime 快取。
+        """
+        dir_mtime = self._dir_cache[0] if self._dir_cache else None
+        if self._file_index is not None and self._file_index[0] == dir_mtime:
+            return self._file_index[1]
+        index = {}
+        for csv_file in csv_files:
+            try:
+                with open(csv_file, 'rb') as f:
+                    head = f.read(16384)
+            except OSError:
+                continue
+            # 只解析完整的行，避免截斷的日期被誤判
+            if len(head) == 16384:
+                head = head[:head.rfind(b'\n') + 1]
+            reader = csv.reader(io.StringIO(head.decode('big5', errors='ignore')))
+            for i, row in enumerate(reader):
+                if i > 20:  # 只檢查前21行
+                    break
+                # 檢查日期欄位（第3列，索引2）
+                if len(row) >= 3 and row[2]:
+                    parsed_date = self._parse_ir_date(row[2], 0)
+                    if parsed_date:
+                        index.setdefault((parsed_date.year, parsed_date.month), csv_file)
+        self._file_index = (dir_mtime, index)
+        return index
     
     def _find_csv_file(self, year: int, month: int, market: str = 'sii') -> Optional[Path]:
         """
-        查找對應的CSV文件
+        查找對應的CSV文件（結果以目錄 mtime 快取，目錄未變動時只需一次 stat）
+        
+        Args:
+            year: 民國年（例如115表示2026年）
+            month: 月份
+            market: 市場別（'sii'=上市, 'otc'=上櫃）
+            
+        Returns:
+            CSV文件路徑，如果不存在則返回None
+        """
+        try:
+            dir_mtime = self.csv_dir.stat().st_mtime_ns
+        except OSError:
+            return None
+        if self._find_cache[0] != dir_mtime:
+            self._find_cache = (dir_mtime, {})
+        found = self._find_cache[1]
+        key = (year, month, market)
+        if key not in found:
+            found[key] = self._locate_csv_file(year, month, market)
+        return found[key]
+    
+    def _locate_csv_file(self, year: int, month: int, market: str = 'sii') -> Optional[Path]:
+        """
+        查找對應的CSV文件（不經快取）
         
         Args:
             year: 民國年（例如115表示2026年）
@@ -99,59 +219,119 @@ class IRFetcher:
         gregorian_year = year + 1911
         
         # 優先查找按月份命名的文件（例如：1月.csv, 2月.csv）
-        month_names = {
-            1: '1月', 2: '2月', 3: '3月', 4: '4月', 5: '5月', 6: '6月',
-            7: '7月', 8: '8月', 9: '9月', 10: '10月', 11: '11月', 12: '12月'
-        }
-        
-        month_name = month_names.get(month, f'{month}月')
-        named_file = self.csv_dir / f'{month_name}.csv'
+        named_file = self.csv_dir / f'{month}月.csv'
         if named_file.exists():
             return named_file
         
         # 如果沒有按月份命名的文件，查找所有CSV文件
-        csv_files = list(self.csv_dir.glob('*.csv'))
+        # 按修改時間排序（最新的在前）
+        csv_files = self._list_csv_files()
         
         if not csv_files:
             return None
         
-        # 按修改時間排序（最新的在前）
-        csv_files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-        
         # 如果只有少數文件，按順序對應月份
         if len(csv_files) <= 12:
             # 假設文件按月份順序排列
             if month <= len(csv_files):
                 return csv_files[month - 1]
         
-        # 如果文件較多，嘗試通過文件內容判斷
-        for csv_file in csv_files:
-            try:
-                # 嘗試讀取文件內容，檢查是否包含對應年月的數據
-                with open(csv_file, 'r', encoding='big5', errors='ignore') as f:
-                    reader = csv.reader(f)
-                    # 讀取前20行檢查
-                    found_match = False
-                    for i, row in enumerate(reader):
-                        if i > 20:  # 只檢查前20行
-                            break
-                        if len(row) >= 3:
-                            # 檢查日期欄位（第3列，索引2）
-                            date_str = row[2] if len(row) > 2 else ''
-                            if date_str:
-                                parsed_date = self._parse_ir_date(date_str, year)
-                                if parsed_date:
-                                    if parsed_date.year == gregorian_year and parsed_date.month == month:
-                                        found_match = True
-                                        break
-                    if found_match:
-                        return csv_file
-            except:
-                continue
+        # 如果文件較多，通過文件內容判斷（年月 -> 檔案 的索引，目錄不變時只建一次）
+        matched = self._get_file_index(csv_files).get((gregorian_year, month))
+        if matched:
+            return matched
         
         # 如果找不到匹配的，返回第一個文件
         return csv_files[0] if csv_files else None
     
+    def _load_csv_file(self, csv_file: Path) -> Tuple[List[IRMeetingRow], bool]:
+        """
+        讀取並解析整個CSV文件，回傳 (所有日期有效的資料列, 是否已按日期排序)；資料列為 IRMeetingRow，meeting_date 為 datetime。
+        以 (路徑, 檔案 mtime_ns) 快取，同一檔案不論被查詢幾個月份/市場都只解析一次。
+        """
+        mtime = csv_file.stat().st_mtime_ns
+        cached = self._file_rows.get(csv_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        
+        # 程序重啟後先試磁碟快取（csv_dir/.cache），來源檔案 mtime 相同才採用
+        cache_path = self.csv_dir / '.cache' / (hashlib.md5(csv_file.name.encode('utf-8')).hexdigest() + '.pkl')
+        try:
+            with open(cache_path, 'rb') as f:
+                version, cached_mtime, parsed = pickle.load(f)
+            if version == _PARSED_CACHE_VERSION and cached_mtime == mtime:
+                rows_sorted = self._rows_sorted(parsed)
+                self._file_rows[csv_file] = (mtime, parsed, rows_sorted)
+                return parsed, rows_sorted
+        except Exception:
+            pass
+        
+        candidates = []
+        # 讀取CSV文件（使用Big5編碼）：整檔一次讀入再一次解碼，不走逐塊的文字模式解碼
+        text = self._read_csv_text(csv_file)
+        
+        # 以 regex 在整段文字中定位表頭行，從表頭行開始交給 csv.reader
+        m = _HEADER_RE.search(text)
+        header_offset = text.rfind('\n', 0, m.start()) + 1 if m else 0
+        csv_reader = csv.reader(io.StringIO(text[header_offset:]))
+        # 跳過表頭（找不到表頭時跳過第一行）
+        next(csv_reader, None)
+        
+        # 解析數據行
+        for row in csv_reader:
+            if len(row) >= 3:  # 至少要有公司代號、名稱、日期
+                company_code = row[0].strip()
+                company_name = row[1].strip()
+                
+                # 跳過空行或無效數據
+                if not company_code or not company_name:
+                    continue
+                if '公司代號' in company_code or '公司名稱' in company_code:
+                    continue
+                
+                candidates.append((
+                    company_code,
+                    company_name,
+                    row[2],
+                    row[3].strip() if len(row) > 3 else '',
+                    row[4].strip() if len(row) > 4 else '',
+                ))
+        
+        # 日期欄整欄一次解析（格式可能是 115/01/28 或 116/01/28）
+        dates = self._parse_ir_date_series(pd.Series([c[2] for c in candidates], dtype=object))
+        parsed = [
+            IRMeetingRow(code, name, meeting_date.to_pydatetime(), meeting_date.date().isoformat(), meeting_time, location)
+            for (code, name, _, meeting_time, location), meeting_date in zip(candidates, dates)
+            if not pd.isna(meeting_date)
+        ]
+        
+        rows_sorted = self._rows_sorted(parsed)
+        self._file_rows[csv_file] = (mtime, parsed, rows_sorted)
+        try:
+            cache_path.parent.mkdir(exist_ok=True)
+            tmp_path = cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((_PARSED_CACHE_VERSION, mtime, parsed), f, protocol=5)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            pass
+        return parsed, rows_sorted
+    
+    @staticmethod
+    def _read_csv_text(csv_file: Path) -> str:
+        """以 Big5 解碼整個檔案：一般大小一次 read 進 bytes；大檔改用 mmap 直接解碼"""
+        with open(csv_file, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= _MMAP_THRESHOLD:
+                return f.read().decode('big5', errors='ignore')
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return str(mm, 'big5', 'ignore')
+    
+    @staticmethod
+    def _rows_sorted(rows: List[IRMeetingRow]) -> bool:
+        """資料列是否已按會議日期遞增排列（是則查詢時可提前結束掃描）"""
+        return all(a.meeting_date <= b.meeting_date for a, b in zip(rows, rows[1:]))
+    
     def fetch_ir_meetings(self, year: int, month: int, market: str = 'sii') -> List[Dict]:
         """
         從本地CSV文件讀取法說會資料
@@ -167,8 +347,9 @@ class IRFetcher:
         cache_key = f"ir_{year}_{month}_{market}"
         
         # 檢查緩存
-        if self._is_cache_valid(cache_key):
-            return self.cache[cache_key]
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         meetings = []
         
@@ -180,73 +361,40 @@ class IRFetcher:
             return []
         
         try:
-            # 讀取CSV文件（使用Big5編碼）
-            with open(csv_file, 'r', encoding='big5', errors='ignore') as f:
-                csv_reader = csv.reader(f)
-                rows = list(csv_reader)
-                
-                # 找到表頭行
-                header_row = -1
-                for i, row in enumerate(rows):
-                    if len(row) > 0:
-                        row_text = ' '.join(row)
-                        # 檢查是否包含表頭關鍵字
-                        if '公司代號' in row_text or '公司名稱' in row_text or '召開' in row_text:
-                            header_row = i
-                            break
-                
-                # 如果找到表頭，從下一行開始解析
-                start_row = header_row + 1 if header_row >= 0 else 1
-                
-                # 解析數據行
-                for row in rows[start_row:]:
-                    if len(row) >= 3:  # 至少要有公司代號、名稱、日期
-                        try:
-                            company_code = row[0].strip() if len(row) > 0 else ''
-                            company_name = row[1].strip() if len(row) > 1 else ''
-                            meeting_date_str = row[2].strip() if len(row) > 2 else ''
-                            meeting_time = row[3].strip() if len(row) > 3 else ''
-                            location = row[4].strip() if len(row) > 4 else ''
-                            
-                            # 跳過空行或無效數據
-                            if not company_code or not company_name:
-                                continue
-                            if '公司代號' in company_code or '公司名稱' in company_code:
-                                continue
-                            
-                            # 解析日期（格式可能是 115/01/28 或 116/01/28）
-                            meeting_date = self._parse_ir_date(meeting_date_str, year)
-                            
-                            # 如果日期解析成功，添加數據（不嚴格限制月份，因為CSV文件可能包含多個月的數據）
-                            if meeting_date:
-                                gregorian_year = year + 1911
-                                # 允許年份有1年的誤差（因為CSV可能是去年的數據）
-                                year_diff = abs(meeting_date.year - gregorian_year)
-                                # 如果年份匹配，且月份也匹配，則添加
-                                # 但如果查詢的月份文件不存在，也允許添加相近月份的數據（±1個月）
-                                if year_diff <= 1:
-                                    # 嚴格匹配月份，或者允許±1個月的誤差（處理文件命名和實際內容不匹配的情況）
-                                    month_diff = abs(meeting_date.month - month)
-                                    if month_diff == 0 or (month_diff <= 1 and len(meetings) == 0):
-                                        meetings.append({
-                                            'company_code': company_code,
-                                            'company_name': company_name,
-                                            'meeting_date': meeting_date.isoformat(),
-                                            'meeting_time': meeting_time,
-                                            'location': location,
-                                            'year': year,
-                                            'month': month,
-                                            'market': market
-                                        })
-                        except Exception as e:
-                            continue
-                            
+            rows, rows_sorted = self._load_csv_file(csv_file)
         except Exception as e:
             print(f"讀取CSV文件時發生錯誤: {str(e)}")
+            rows, rows_sorted = [], False
+        
+        gregorian_year = year + 1911
+        # 可能符合的最晚年月：隔年、月份 +1；已排序的檔案超過此年月即可停止
+        last_match = (gregorian_year + 1, min(month + 1, 12))
+        # 允許年份有1年的誤差（因為CSV可能是去年的數據）；月份允許±1（處理文件命名和實際內容不匹配的情況）
+        # 年、月各自獨立比對（例如 1 月不會延伸到前一年 12 月），故以上下界取代逐列的 abs 計算
+        year_lo, year_hi = gregorian_year - 1, gregorian_year + 1
+        month_lo, month_hi = month - 1, month + 1
+        for row in rows:
+            meeting_date = row.meeting_date
+            y, m = meeting_date.year, meeting_date.month
+            if rows_sorted and (y, m) > last_match:
+                break
+            if year_lo <= y <= year_hi and month_lo <= m <= month_hi:
+                # 嚴格匹配月份；±1個月只在尚未找到任何資料時接受
+                if m == month or not meetings:
+                    meetings.append({
+                        'company_code': row.company_code,
+                        'company_name': row.company_name,
+                        'meeting_date': meeting_date.isoformat(),
+                        'meeting_date_iso': row.meeting_date_iso,
+                        'meeting_time': row.meeting_time,
+                        'location': row.location,
+                        'year': year,
+                        'month': month,
+                        'market': market
+                    })
         
         # 更新緩存
-        self.cache[cache_key] = meetings
-        self.cache_time[cache_key] = time.time()
+        self.cache.set(cache_key, meetings)
         
         return meetings
     
@@ -306,21 +454,14 @@ class IRFetcher:
         """
         meetings = self.get_upcoming_ir_meetings(months_ahead)
         
-        # 按日期分組
-        timeline = {}
-        for meeting in meetings:
-            date_str = meeting.get('meeting_date', '')[:10]  # 只取日期部分
-            if date_str not in timeline:
-                timeline[date_str] = []
-            timeline[date_str].append(meeting)
-        
-        # 轉換為列表格式（按日期排序）
+        # 按日期分組（meetings 已按日期排序，同日期必相鄰，直接 groupby 即為日期順序）
         timeline_list = []
-        for date_str in sorted(timeline.keys()):
+        for date_str, group in groupby(meetings, key=itemgetter('meeting_date_iso')):
+            day_meetings = list(group)
             timeline_list.append({
                 'date': date_str,
-                'meetings': timeline[date_str],
-                'count': len(timeline[date_str])
+                'meetings': day_meetings,
+                'count': len(day_meetings)
             })
         
         return {
@@ -398,11 +539,7 @@ class IRFetcher:
         import re
         detected_month = self._detect_month_from_csv_content(content)
         if detected_month is not None:
-            month_names = {
-                1: '1月', 2: '2月', 3: '3月', 4: '4月', 5: '5月', 6: '6月',
-                7: '7月', 8: '8月', 9: '9月', 10: '10月', 11: '11月', 12: '12月'
-            }
-            safe = f'{month_names[detected_month]}.csv'
+            safe = f'{detected_month}月.csv'
         else:
             base = Path(filename).name
             if not base.lower().endswith('.csv'):
@@ -415,5 +552,7 @@ class IRFetcher:
         with open(path, 'wb') as f:
             f.write(content)
         self.cache.clear()
-        self.cache_time.clear()
+        self._dir_cache = None
+        self._file_index = None
+        self._find_cache = (None, {})
         return (safe, detected_month)
\ No newline at end of file
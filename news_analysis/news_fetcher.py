@@ -1,63 +1,292 @@
 """
 新聞數據獲取模組 - 從新聞網站抓取
 """
-import requests
 from bs4 import BeautifulSoup
 import feedparser
+import calendar
+import functools
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
-import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
 import re
+import threading
 from collections import Counter
-from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus, urlparse
 from config import Config
+from market_data.http_session import create_session
+from market_data.rate_limit import TokenBucket
+from market_data.ttl_cache import TTLCache
+
+# lxml 為選用：有安裝則 Google News RSS 走 lxml 直接解析（固定格式，比 feedparser 快），否則一律用 feedparser
+try:
+    from lxml import etree
+    _XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True)
+except ImportError:
+    etree = None
+
+# pyahocorasick 為選用：有安裝則以 Aho-Corasick 自動機一次掃描比對所有公司名稱/代碼，否則逐一子字串比對
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 盤前新聞各來源並行抓取的執行緒數
+NEWS_FETCH_WORKERS = 8
+# 同一主機同時進行中的請求上限（來源幾乎都是 news.google.com，避免瞬間湧入）
+PER_HOST_LIMIT = 4
+# 同一主機的請求平均間隔（秒）；取代原本不分主機、每個來源固定 sleep 0.3 秒
+PER_HOST_INTERVAL = 0.3
+# 單一 RSS 回應的大小上限（位元組），超過即放棄，避免異常回應佔用大量記憶體
+MAX_FEED_BYTES = 2 << 20
+# 每個 RSS 來源最多處理的項目數（Google News 搜尋結果本身最多 100 筆）
+MAX_FEED_ENTRIES = 200
+
+# _parse_datetime 支援的格式都以「四位數年份 + - 或 /」開頭，不符者（如 RFC 822）免跑 strptime
+_DT_PREFIX_RE = re.compile(r'\d{4}[-/]')
+# 常見格式快速路徑：YYYY-MM-DD[( |T)HH:MM:SS[Z]]、YYYY/MM/DD HH:MM[:SS]
+_DT_RE = re.compile(r'(\d{4})([-/])(\d{2})\2(\d{2})(?:([ T])(\d{2}):(\d{2})(?::(\d{2}))?(Z)?)?')
+_DT_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y/%m/%d %H:%M',
+    '%Y-%m-%d',
+)
+
+# 從 URL 推斷發布者：(比對字串, 發布者)，排列順序即優先順序（同一連結命中多個時取排前者）
+_PUBLISHER_HINTS = (
+    ('cnyes', '鉅亨網'),
+    ('udn.com', '經濟日報'),
+    ('money.udn', '經濟日報'),
+    ('yahoo', 'Yahoo 財經'),
+    ('wsj', 'Wall Street Journal'),
+    ('wallstreetjournal', 'Wall Street Journal'),
+    ('reuters.com', 'Reuters'),
+    ('bloomberg.com', 'Bloomberg'),
+)
+_PUBLISHER_RE = re.compile('|'.join(re.escape(hint) for hint, _ in _PUBLISHER_HINTS))
+_PUBLISHER_RANK = {hint: (rank, publisher) for rank, (hint, publisher) in enumerate(_PUBLISHER_HINTS)}
+
+# Google News description 只會有 <a href="..." target="_blank">、<font color="#xxxxxx"> 兩種標籤；
+# 出現其他標籤或實體時需經 feedparser 淨化，快速解析改回 feedparser
+_GNEWS_UNSAFE_RE = re.compile(
+    r'<(?!a href="[^"<>&]*"(?: target="_blank")?>|/a>|font color="#[0-9a-fA-F]{6}">|/font>)'
+    r'|&(?!nbsp;)'
+)
+# Google News RSS item 的子元素；出現其他元素（feedparser 可能對應到 title/summary 等欄位）時改回 feedparser
+_GNEWS_ITEM_TAGS = frozenset(('title', 'link', 'guid', 'pubDate', 'description', 'source'))
+
+# 共用 keep-alive 連線池：同一主機的多次 RSS 請求重用 TCP/TLS 連線（Session 可跨執行緒共用）
+SESSION = create_session(pool_maxsize=32, retries=2)
+SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+})
+
+# 主機 -> (同時請求數 semaphore, 請求頻率 token bucket)；模組層共用，多個 NewsFetcher 實例合計受限
+_HOST_LIMITS: Dict[str, Tuple[threading.Semaphore, TokenBucket]] = {}
+_HOST_LIMITS_LOCK = threading.Lock()
+
+
+def _host_limits(url: str) -> Tuple[threading.Semaphore, TokenBucket]:
+    """取得 URL 所屬主機的並行額度與節流器（只節制同一主機，不同主機互不等待）"""
+    host = urlparse(url).netloc
+    with _HOST_LIMITS_LOCK:
+        limits = _HOST_LIMITS.get(host)
+        if limits is None:
+            limits = _HOST_LIMITS[host] = (
+                threading.Semaphore(PER_HOST_LIMIT),
+                TokenBucket(rate=1 / PER_HOST_INTERVAL, capacity=PER_HOST_LIMIT),
+            )
+    return limits
+
+
+def _infer_publisher(link: str) -> str:
+    """以單一正則掃描連結推斷發布者，找不到時回傳 'Unknown'"""
+    hits = _PUBLISHER_RE.findall(link)
+    if not hits:
+        return 'Unknown'
+    return min(_PUBLISHER_RANK[hit] for hit in hits)[1]
+
+
+@functools.lru_cache(maxsize=4096)
+def _build_gnews_url(keywords: tuple, language: str, region: str) -> str:
+    """組出 Google News RSS 搜尋 URL（同一組關鍵詞/語言/地區的 URL 固定，快取起來免重複 quote_plus）"""
+    query = '+'.join([quote_plus(k) for k in keywords])
+    if region == 'US':
+        return f"https://news.google.com/rss/search?q={query}&hl=en&gl=US&ceid=US:en"
+    return f"https://news.google.com/rss/search?q={query}&hl={language}&gl={region}&ceid={region}:{language}"
+
+
+def _parse_gnews_fast(content: bytes) -> Optional[list]:
+    """
+    以 lxml 解析 Google News RSS，回傳與 feedparser 欄位相同的 entries（title/link/summary/published/source）。
+    內容超出固定格式（缺欄位、需淨化的 HTML、無時區的日期…）時回傳 None，由呼叫端改用 feedparser。
+    """
+    if etree is None:
+        return None
+    try:
+        root = etree.fromstring(content, parser=_XML_PARSER)
+    except etree.XMLSyntaxError:
+        return None
+    entries = []
+    for item in root.iterfind('channel/item'):
+        fields = {}
+        for child in item:
+            # 重複或非預期的元素：feedparser 的取值規則（取最後一個、命名空間對應）不在此重現
+            if child.tag not in _GNEWS_ITEM_TAGS or child.tag in fields:
+                return None
+            fields[child.tag] = child
+        title = fields['title'].text if 'title' in fields else None
+        link = fields['link'].text if 'link' in fields else None
+        published = fields['pubDate'].text if 'pubDate' in fields else None
+        summary = fields['description'].text or '' if 'description' in fields else ''
+        if not title or not link or not published:
+            return None
+        if '<' in title or title != title.strip() or link != link.strip() or _GNEWS_UNSAFE_RE.search(summary):
+            return None
+        try:
+            pub_time = parsedate_to_datetime(published)
+        except (TypeError, ValueError):
+            return None
+        if pub_time.tzinfo is None:
+            return None
+        entry = feedparser.FeedParserDict(
+            title=title,
+            link=link,
+            summary=summary,
+            published=published,
+            published_parsed=pub_time.astimezone(timezone.utc).timetuple(),
+        )
+        source = fields.get('source')
+        if source is not None:
+            entry['source'] = feedparser.FeedParserDict(href=source.get('url', ''), title=source.text or '')
+        entries.append(entry)
+    return entries
+
+
+@functools.lru_cache(maxsize=8)
+def _company_index(items: tuple) -> tuple:
+    """
+    ((symbol, name), ...) -> ((symbol, 小寫名稱, 代碼去掉 .TW 等後綴), ...)，同一份公司清單只轉換一次。
+    代碼維持原大小寫（與既有比對行為一致）。
+    """
+    return tuple((symbol, name.lower(), symbol.split('.')[0]) for symbol, name in items)
+
+
+@functools.lru_cache(maxsize=8)
+def _company_automaton(items: tuple):
+    """
+    由 ((symbol, name), ...) 建立 Aho-Corasick 自動機，回傳 (automaton, 必定命中的 symbols)。
+    比對字串同 _company_index；空字串必定命中，無法加入自動機故另外回傳。
+    """
+    needles: Dict[str, set] = {}
+    always = set()
+    for symbol, name_lower, symbol_base in _company_index(items):
+        for needle in (name_lower, symbol_base):
+            if needle:
+                needles.setdefault(needle, set()).add(symbol)
+            else:
+                always.add(symbol)
+    if not needles:
+        return None, frozenset(always)
+    automaton = ahocorasick.Automaton()
+    for needle, symbols in needles.items():
+        automaton.add_word(needle, tuple(symbols))
+    automaton.make_automaton()
+    return automaton, frozenset(always)
+
 
 class NewsFetcher:
     """新聞數據獲取器 - 從新聞網站抓取"""
     
     def __init__(self):
-        self.cache = {}
-        self.cache_time = {}
         self.cache_duration = 600  # 緩存10分鐘，減輕算力
+        # 盤前新聞查詢結果（LRU + TTL，過期或超過上限自動淘汰）
+        self.cache = TTLCache(ttl=self.cache_duration, maxsize=256)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        
-    def _is_cache_valid(self, key: str) -> bool:
-        """檢查緩存是否有效"""
-        if key not in self.cache_time:
-            return False
-        elapsed = time.time() - self.cache_time[key]
-        return elapsed < self.cache_duration
-    
+        # RSS URL -> 已解析的 entries；不同搜尋任務或不同 hours 查同一 URL 時只下載、解析一次
+        self.url_cache = TTLCache(ttl=self.cache_duration, maxsize=512)
+        # 新聞聲量統計用的公司清單（Config 為靜態設定，建立一次即可）
+        self._company_list: Dict[str, str] = {
+            **Config.US_INDICES,
+            **Config.US_STOCKS,
+            **Config.TW_MARKETS,
+            **Config.INTERNATIONAL_MARKETS,
+        }
+        self._company_items = tuple(self._company_list.items())
+
     def _parse_datetime(self, date_str: str, default_tz=None) -> Optional[datetime]:
         """解析日期時間字符串"""
         if not date_str:
             return None
+        date_str = date_str.strip()
+        if not _DT_PREFIX_RE.match(date_str):
+            return None
         
-        # 嘗試多種日期格式
-        formats = [
-            '%Y-%m-%d %H:%M:%S',
-            '%Y-%m-%dT%H:%M:%S',
-            '%Y-%m-%dT%H:%M:%SZ',
-            '%Y/%m/%d %H:%M:%S',
-            '%Y/%m/%d %H:%M',
-            '%Y-%m-%d',
-        ]
+        dt = None
+        m = _DT_RE.fullmatch(date_str)
+        if m:
+            year, sep, month, day, tsep, hour, minute, second, z = m.groups()
+            # 只接受 _DT_FORMATS 中確實存在的組合（例如 '/' 一定帶時間、Z 只跟在 T 格式後）
+            if sep == '-':
+                supported = hour is None or (second is not None and (z is None or tsep == 'T'))
+            else:
+                supported = hour is not None and tsep == ' ' and z is None
+            if supported:
+                try:
+                    dt = datetime(int(year), int(month), int(day),
+                                  int(hour or 0), int(minute or 0), int(second or 0))
+                except ValueError:
+                    dt = None
         
-        for fmt in formats:
-            try:
-                dt = datetime.strptime(date_str.strip(), fmt)
-                if default_tz:
-                    if dt.tzinfo is None:
-                        dt = default_tz.localize(dt)
-                return dt
-            except:
-                continue
+        if dt is None:
+            # 快速路徑未涵蓋的寫法（單位數月日等）仍逐一嘗試 strptime
+            for fmt in _DT_FORMATS:
+                try:
+                    dt = datetime.strptime(date_str, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                return None
         
-        return None
+        if default_tz and dt.tzinfo is None:
+            dt = default_tz.localize(dt)
+        return dt
+    
+    def _get_feed_entries(self, rss_url: str) -> list:
+        """下載並解析 RSS，回傳 feed entries（以 URL 快取 cache_duration 秒，空結果不快取）"""
+        entries = self.url_cache.get(rss_url)
+        if entries is not None:
+            return entries
+        # 以共用 Session 串流下載，再交給 feedparser 解析 bytes（不走 feedparser 內建的 urllib 抓取）
+        chunks, size = [], 0
+        slot, bucket = _host_limits(rss_url)
+        bucket.acquire()
+        with slot:
+            with SESSION.get(rss_url, timeout=10, stream=True) as resp:
+                if resp.status_code != 200:
+                    return []
+                for chunk in resp.iter_content(65536):
+                    size += len(chunk)
+                    if size > MAX_FEED_BYTES:
+                        print(f"RSS feed too large, skipped: {rss_url}")
+                        return []
+                    chunks.append(chunk)
+        content = b''.join(chunks)
+        entries = _parse_gnews_fast(content) if 'news.google.com' in rss_url else None
+        if entries is None:
+            entries = feedparser.parse(content).entries
+        if entries:
+            self.url_cache.set(rss_url, entries)
+        return entries
     
-    def fetch_from_rss(self, rss_url: str, keywords: List[str] = None, hours: int = 12, filter_keywords: bool = True) -> List[Dict]:
+    def fetch_from_rss(self, rss_url: str, keywords: List[str] = None, hours: int = 12, filter_keywords: bool = True,
+                       start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Dict]:
         """
         從 RSS Feed 獲取新聞
         
@@ -66,6 +295,8 @@ class NewsFetcher:
             keywords: 關鍵詞列表（用於過濾，如果 filter_keywords=False 則不過濾）
             hours: 時間範圍（小時）
             filter_keywords: 是否進行關鍵詞過濾（預設True，RSS源通常設為False）
+            start_time: 發佈時間下界（aware datetime，與 hours 取較晚者）
+            end_time: 發佈時間上界（aware datetime，晚於此時間的新聞略過）
             
         Returns:
             新聞列表
@@ -73,26 +304,35 @@ class NewsFetcher:
         news_list = []
         # 使用 UTC 時區的 cutoff_time
         cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours)
+        if start_time is not None and start_time > cutoff_time:
+            cutoff_time = start_time
+        
+        # 關鍵詞先轉小寫一次，逐筆比對時不再重複 lower()
+        keywords_lower = tuple(keyword.lower() for keyword in keywords) if filter_keywords and keywords else ()
         
         try:
-            feed = feedparser.parse(rss_url)
+            entries = self._get_feed_entries(rss_url)[:MAX_FEED_ENTRIES]
+            # 全部項目都有發布時間且按時間遞減排列時，遇到第一筆早於 cutoff 的項目即可停止
+            stamps = [entry.get('published_parsed') for entry in entries]
+            newest_first = all(stamps) and all(a[:6] >= b[:6] for a, b in zip(stamps, stamps[1:]))
             
-            for entry in feed.entries:
+            for entry in entries:
                 title = entry.get('title', '')
                 link = entry.get('link', '')
                 summary = entry.get('summary', '')
                 
                 # 關鍵詞過濾（只有當 filter_keywords=True 時才過濾）
                 # RSS源（如鉅亨、經濟日報）本身就是台股新聞，不需要過濾
-                if filter_keywords and keywords:
+                if keywords_lower:
                     text = (title + ' ' + summary).lower()
-                    if not any(keyword.lower() in text for keyword in keywords):
+                    if not any(keyword in text for keyword in keywords_lower):
                         continue
                 
                 # 解析時間
                 pub_time = None
                 if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                    pub_time = datetime(*entry.published_parsed[:6], tzinfo=timezone.utc)
+                    # published_parsed 為 UTC 的 struct_time：轉 epoch 後直接建立 aware datetime
+                    pub_time = datetime.fromtimestamp(calendar.timegm(entry.published_parsed), tz=timezone.utc)
                 elif hasattr(entry, 'published'):
                     pub_time = self._parse_datetime(entry.published)
                     if pub_time and pub_time.tzinfo is None:
@@ -106,30 +346,22 @@ class NewsFetcher:
                 
                 # 時間過濾（確保都是 aware datetime）
                 if pub_time < cutoff_time:
+                    if newest_first:
+                        break
+                    continue
+                if end_time is not None and pub_time > end_time:
                     continue
                 
                 # 過濾 Facebook 新聞（先檢查連結）
-                if 'facebook.com' in link.lower() or 'fb.com' in link.lower():
+                link_lower = link.lower()
+                if 'facebook.com' in link_lower or 'fb.com' in link_lower:
                     continue
                 
                 # 獲取發布者
                 publisher = entry.get('source', {}).get('title', '') if hasattr(entry, 'source') else ''
                 if not publisher:
                     # 從 URL 推斷發布者
-                    if 'cnyes.com' in link or 'cnyes' in link:
-                        publisher = '鉅亨網'
-                    elif 'udn.com' in link or 'money.udn' in link:
-                        publisher = '經濟日報'
-                    elif 'yahoo.com' in link or 'yahoo' in link:
-                        publisher = 'Yahoo 財經'
-                    elif 'wsj.com' in link or 'wsj' in link or 'wallstreetjournal' in link:
-                        publisher = 'Wall Street Journal'
-                    elif 'reuters.com' in link:
-                        publisher = 'Reuters'
-                    elif 'bloomberg.com' in link:
-                        publisher = 'Bloomberg'
-                    else:
-                        publisher = 'Unknown'
+                    publisher = _infer_publisher(link)
                 
                 # 再次檢查發布者是否為 Facebook
                 if 'facebook' in publisher.lower():
@@ -149,7 +381,8 @@ class NewsFetcher:
         
         return news_list
     
-    def fetch_from_google_news(self, keywords: List[str], hours: int = 12, language: str = 'zh-TW', region: str = 'TW') -> List[Dict]:
+    def fetch_from_google_news(self, keywords: List[str], hours: int = 12, language: str = 'zh-TW', region: str = 'TW',
+                               start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Dict]:
         """
         從 Google News RSS 獲取新聞
         
@@ -158,20 +391,19 @@ class NewsFetcher:
             hours: 時間範圍（小時）
             language: 語言代碼
             region: 地區代碼
+            start_time: 發佈時間下界（見 fetch_from_rss）
+            end_time: 發佈時間上界（見 fetch_from_rss）
             
         Returns:
             新聞列表
         """
         # Google News RSS URL (需要 URL 編碼)
-        query = '+'.join([quote_plus(k) for k in keywords])
-        if region == 'US':
-            rss_url = f"https://news.google.com/rss/search?q={query}&hl=en&gl=US&ceid=US:en"
-        else:
-            rss_url = f"https://news.google.com/rss/search?q={query}&hl={language}&gl={region}&ceid={region}:{language}"
+        rss_url = _build_gnews_url(tuple(keywords), language, region)
         
-        return self.fetch_from_rss(rss_url, keywords, hours)
+        return self.fetch_from_rss(rss_url, keywords, hours, start_time=start_time, end_time=end_time)
     
-    def get_premarket_news(self, keywords: List[str], hours: int = 12, market: str = 'taiwan') -> List[Dict]:
+    def get_premarket_news(self, keywords: List[str], hours: int = 12, market: str = 'taiwan',
+                           start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> List[Dict]:
         """
         獲取盤前新聞（使用關鍵詞搜索，每個關鍵詞單獨搜索）
         
@@ -179,19 +411,26 @@ class NewsFetcher:
             keywords: 關鍵詞列表（例如：['台股', '盤前', '美股', '美股盤後']）
             hours: 時間範圍（小時，預設12小時）
             market: 市場類型 ('taiwan' 或 'us')
+            start_ts: 發佈時間下界（epoch 秒，選填；與 hours 取較晚者）
+            end_ts: 發佈時間上界（epoch 秒，選填）
             
         Returns:
             新聞列表
         """
-        cache_key = f"premarket_{market}_{'_'.join(keywords)}_{hours}"
+        cache_key = f"premarket_{market}_{'_'.join(keywords)}_{hours}_{start_ts}_{end_ts}"
         
         # 檢查緩存
-        if self._is_cache_valid(cache_key):
-            return self.cache[cache_key]
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         all_news = []
         # 使用 UTC 時區的 cutoff_time
         cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours)
+        # 呼叫端指定的時間窗在解析階段就套用，時間窗外的新聞不進入去重與回傳列表
+        if start_ts is not None:
+            cutoff_time = max(cutoff_time, datetime.fromtimestamp(start_ts, tz=timezone.utc))
+        end_time = datetime.fromtimestamp(end_ts, tz=timezone.utc) if end_ts is not None else None
         
         if market == 'taiwan':
             # 台股新聞來源 - 每個關鍵詞單獨搜索
@@ -294,41 +533,18 @@ class NewsFetcher:
         # 按優先級排序
         news_sources.sort(key=lambda x: x.get('priority', 99))
         
-        # 從各個來源獲取新聞（每個關鍵詞單獨搜索）
-        for source in news_sources:
-            try:
-                if source['type'] == 'google':
-                    language = source.get('language', 'en')
-                    region = source.get('region', 'US')
-                    # 使用單個關鍵詞或關鍵詞組合搜索
-                    news = self.fetch_from_google_news(source['keywords'], hours, language, region)
-                elif source['type'] == 'rss':
-                    # RSS源不過濾關鍵詞，因為它們本身就是相關新聞源
-                    news = self.fetch_from_rss(source['url'], source.get('keywords'), hours, filter_keywords=False)
-                else:
-                    continue
-                
-                # 過濾時間範圍（確保時區一致）
-                filtered_news = []
-                for n in news:
-                    pub_time = n.get('published_at')
-                    if isinstance(pub_time, datetime):
-                        # 確保有時區信息
-                        if pub_time.tzinfo is None:
-                            pub_time = pub_time.replace(tzinfo=timezone.utc)
-                        if pub_time >= cutoff_time:
-                            filtered_news.append(n)
-                
-                all_news.extend(filtered_news)
-                time.sleep(0.3)  # 避免請求過快
-                
-            except Exception as e:
-                print(f"Error fetching from {source.get('name', 'unknown')}: {str(e)}")
-                continue
+        # 從各個來源並行獲取新聞（每個關鍵詞單獨搜索）；map 依 news_sources 順序回傳，
+        # 合併順序與逐一抓取時相同，後續去重保留的項目不變
+        if news_sources:
+            with ThreadPoolExecutor(max_workers=min(NEWS_FETCH_WORKERS, len(news_sources))) as executor:
+                for news in executor.map(lambda src: self._fetch_source(src, hours, cutoff_time, end_time), news_sources):
+                    all_news.extend(news)
         
         # 去重（根據標題和連結），並過濾 Facebook
         seen = set()
         seen_titles = set()  # 用於檢查相似標題
+        # 長度 > 10 的已見標題依長度分組：相似度檢查只需比對長度比 > 0.9 的組，不必掃過全部已見標題
+        long_titles_by_len: Dict[int, List[str]] = {}
         unique_news = []
         for n in all_news:
             # 過濾 Facebook 新聞
@@ -348,22 +564,27 @@ class NewsFetcher:
                 continue
             
             # 如果標題完全相同（去除空格和特殊字符後），視為重複
-            title_normalized = ''.join(title.split()).lower()  # 移除所有空格
+            title_normalized = ''.join(title.split())  # 移除所有空格（title 已轉小寫）
             if title_normalized and title_normalized in seen_titles:
                 continue
             
             # 檢查標題相似度（如果標題長度>10且相似度>90%，視為重複）
             is_duplicate = False
-            if len(title_normalized) > 10:
-                for seen_title in seen_titles:
-                    if len(seen_title) > 10:
-                        # 簡單的相似度檢查：如果一個標題包含另一個標題的90%以上，視為重複
-                        shorter = min(len(title_normalized), len(seen_title))
-                        longer = max(len(title_normalized), len(seen_title))
-                        if shorter / longer > 0.9:
-                            if title_normalized in seen_title or seen_title in title_normalized:
-                                is_duplicate = True
-                                break
+            title_len = len(title_normalized)
+            if title_len > 10:
+                # 長度比 > 0.9 的長度範圍（上下各多取一，實際條件仍在迴圈內判斷）
+                for other_len in range(max(11, int(title_len * 0.9)), int(title_len / 0.9) + 2):
+                    # 簡單的相似度檢查：如果一個標題包含另一個標題的90%以上，視為重複
+                    shorter = min(title_len, other_len)
+                    longer = max(title_len, other_len)
+                    if shorter / longer <= 0.9:
+                        continue
+                    for seen_title in long_titles_by_len.get(other_len, ()):
+                        if title_normalized in seen_title or seen_title in title_normalized:
+                            is_duplicate = True
+                            break
+                    if is_duplicate:
+                        break
             
             if is_duplicate:
                 continue
@@ -373,6 +594,8 @@ class NewsFetcher:
                 seen.add(link_key)
             if title_normalized:
                 seen_titles.add(title_normalized)
+                if title_len > 10:
+                    long_titles_by_len.setdefault(title_len, []).append(title_normalized)
             
             unique_news.append(n)
         
@@ -383,11 +606,42 @@ class NewsFetcher:
         ))
         
         # 更新緩存
-        self.cache[cache_key] = unique_news
-        self.cache_time[cache_key] = time.time()
+        self.cache.set(cache_key, unique_news)
         
         return unique_news
     
+    def _fetch_source(self, source: Dict, hours: int, cutoff_time: datetime,
+                      end_time: Optional[datetime] = None) -> List[Dict]:
+        """抓取單一來源並過濾時間範圍（在執行緒池中執行，失敗時回傳空列表）"""
+        try:
+            if source['type'] == 'google':
+                language = source.get('language', 'en')
+                region = source.get('region', 'US')
+                # 使用單個關鍵詞或關鍵詞組合搜索
+                news = self.fetch_from_google_news(source['keywords'], hours, language, region,
+                                                   start_time=cutoff_time, end_time=end_time)
+            elif source['type'] == 'rss':
+                # RSS源不過濾關鍵詞，因為它們本身就是相關新聞源
+                news = self.fetch_from_rss(source['url'], source.get('keywords'), hours, filter_keywords=False,
+                                           start_time=cutoff_time, end_time=end_time)
+            else:
+                return []
+            
+            # 過濾時間範圍（確保時區一致）
+            filtered_news = []
+            for n in news:
+                pub_time = n.get('published_at')
+                if isinstance(pub_time, datetime):
+                    # 確保有時區信息
+                    if pub_time.tzinfo is None:
+                        pub_time = pub_time.replace(tzinfo=timezone.utc)
+                    if pub_time >= cutoff_time and (end_time is None or pub_time <= end_time):
+                        filtered_news.append(n)
+            return filtered_news
+        except Exception as e:
+            print(f"Error fetching from {source.get('name', 'unknown')}: {str(e)}")
+            return []
+    
     def extract_companies_from_text(self, text: str, company_list: Dict[str, str]) -> List[str]:
         """
         從文本中提取公司名稱
@@ -399,19 +653,28 @@ class NewsFetcher:
         Returns:
             出現的公司代碼列表
         """
-        found_companies = []
-        text_lower = text.lower()
+        return self._companies_in(text.lower(), company_list)
+    
+    def _companies_in(self, text_lower: str, company_list: Dict[str, str]) -> List[str]:
+        """extract_companies_from_text 的本體：text_lower 須已轉小寫（呼叫端組字串時一併轉換）"""
+        items = self._company_items if company_list is self._company_list else tuple(company_list.items())
         
-        for symbol, name in company_list.items():
-            # 檢查公司名稱
-            if name.lower() in text_lower:
-                found_companies.append(symbol)
-            # 檢查股票代碼（移除 .TW 等後綴）
-            symbol_base = symbol.split('.')[0]
-            if symbol_base in text_lower:
-                found_companies.append(symbol)
+        if ahocorasick is not None and company_list:
+            # 一次線性掃描找出所有出現的名稱/代碼（自動機依公司清單內容快取）
+            automaton, found = _company_automaton(items)
+            found = set(found)
+            if automaton is not None:
+                for _, symbols in automaton.iter(text_lower):
+                    found.update(symbols)
+            return list(found)
         
-        return list(set(found_companies))  # 去重
+        found = set()
+        for symbol, name_lower, symbol_base in _company_index(items):
+            # 檢查公司名稱，或股票代碼（移除 .TW 等後綴）；名稱已命中就不必再比對代碼
+            if name_lower in text_lower or symbol_base in text_lower:
+                found.add(symbol)
+        
+        return list(found)
     
     def get_news_volume(self, keywords: List[str], hours: int = 24) -> Dict[str, int]:
         """
@@ -450,11 +713,7 @@ class NewsFetcher:
                 'news_by_symbol': { symbol: [ { title, link, publisher, published_at }, ... ] }
             }
         """
-        company_list = {}
-        company_list.update(Config.US_INDICES)
-        company_list.update(Config.US_STOCKS)
-        company_list.update(Config.TW_MARKETS)
-        company_list.update(Config.INTERNATIONAL_MARKETS)
+        company_list = self._company_list
         
         volume_counter = Counter()
         news_by_symbol = {}
@@ -464,19 +723,23 @@ class NewsFetcher:
             for news in news_list:
                 title = news.get('title', '')
                 summary = news.get('summary', '')
-                text = title + ' ' + summary
-                companies = self.extract_companies_from_text(text, company_list)
+                companies = self._companies_in((title + ' ' + summary).lower(), company_list)
+                # 多數新聞不會提到清單中的公司，這時不必建立 item
+                if not companies:
+                    continue
                 link = news.get('link', '')
+                published_at = news.get('published_at', '')
                 item = {
                     'title': title,
                     'link': link,
                     'publisher': news.get('publisher', ''),
-                    'published_at': news.get('published_at').isoformat()
-                    if isinstance(news.get('published_at'), datetime)
-                    else str(news.get('published_at', '')),
+                    'published_at': published_at.isoformat()
+                    if isinstance(published_at, datetime)
+                    else str(published_at),
                 }
+                # 聲量計數交給 Counter.update（C 實作的 _count_elements），逐筆迴圈只處理新聞列表
+                volume_counter.update(companies)
                 for symbol in companies:
-                    volume_counter[symbol] += 1
                     if symbol not in news_by_symbol:
                         news_by_symbol[symbol] = []
                         seen_links_by_symbol[symbol] = set()
@@ -487,20 +750,32 @@ class NewsFetcher:
                         if link:
                             seen_links_by_symbol[symbol].add(link)
         
-        # 中文新聞（台股關鍵詞）
-        news_list_tw = self.get_premarket_news(keywords, hours, market='taiwan')
-        add_news_to_volume(news_list_tw)
-        
-        # 英文新聞（美股關鍵詞），與中文合併聲量
-        if include_english:
-            english_keywords = ['stock', 'semiconductor', 'technology', 'earnings', 'market', 'earnings report']
-            try:
-                news_list_us = self.get_premarket_news(english_keywords, hours, market='us')
-                add_news_to_volume(news_list_us)
-            except Exception as e:
-                print(f"English news volume fetch skipped: {e}")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # 英文新聞（美股關鍵詞）在背景執行緒抓取，與中文新聞同時進行
+            us_future = None
+            if include_english:
+                english_keywords = ['stock', 'semiconductor', 'technology', 'earnings', 'market', 'earnings report']
+                us_future = executor.submit(self.get_premarket_news, english_keywords, hours, market='us')
+            
+            # 中文新聞（台股關鍵詞）
+            news_list_tw = self.get_premarket_news(keywords, hours, market='taiwan')
+            add_news_to_volume(news_list_tw)
+            
+            # 英文新聞與中文合併聲量（先中文後英文，合併順序不變）
+            if us_future is not None:
+                try:
+                    news_list_us = us_future.result()
+                    add_news_to_volume(news_list_us)
+                except Exception as e:
+                    print(f"English news volume fetch skipped: {e}")
         
         return {
             'volume': dict(volume_counter),
             'news_by_symbol': news_by_symbol,
         }
+
+
+@functools.lru_cache(maxsize=1)
+def default_news_fetcher() -> NewsFetcher:
+    """程序內共用的 NewsFetcher（共用快取與各主機限流；未注入 news_fetcher 的分析器都用這一個）"""
+    return NewsFetcher()
@@ -1,20 +1,150 @@
 """
 盤前資料分析模組
 """
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
-import pytz
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import heapq
+import os
+import pickle
 import time
-from news_analysis.news_fetcher import NewsFetcher
+from concurrent.futures import ThreadPoolExecutor
+from news_analysis.news_fetcher import NewsFetcher, default_news_fetcher
+from market_data.log_util import get_logger
+from market_data.ttl_cache import CACHE_DIR
 from config import Config
 
+log = get_logger(__name__)
+
+# 盤前新聞快取有效時間（秒）；記憶體與磁碟快取共用
+PREMARKET_CACHE_TTL = 3600
+# 盤前新聞每個市場最多回傳幾則（按標題排序後的前 N 則）
+PREMARKET_MAX_ITEMS = 200
+# 盤前新聞搜尋關鍵詞（固定值，模組載入時建立一次）
+TW_PREMARKET_KEYWORDS = ('台股', '盤前', '美股', '美股盤後')
+US_PREMARKET_KEYWORDS = ('premarket', 'stock', 'market', 'earnings', 'earnings report')
+
+
+def _title_sort_key(news: Dict) -> str:
+    """新聞按標題排序（不區分大小寫）；無標題者鍵為空字串"""
+    # 抓回的新聞幾乎都有 title，直接取值，缺鍵才走例外
+    try:
+        title = news['title'] or ''
+    except KeyError:
+        title = ''
+    return title.lower()
+
+
+def _filter_window(news_list: List[Dict], tz, start_time: datetime, end_time: datetime) -> List[Dict]:
+    """
+    保留發佈時間在 [start_time, end_time] 內的新聞，並將 published_at 換成 tz 時區（就地修改）。
+    aware datetime 之間可直接比較（以 UTC 時刻為準），先比較再轉時區，只有留下的新聞才需要 astimezone。
+    """
+    if not news_list:
+        # 離峰或抓取失敗時常見，不必進入迴圈
+        return []
+    filtered_news = []
+    for n in news_list:
+        try:
+            pub_time = n['published_at']
+        except KeyError:
+            continue
+        if isinstance(pub_time, datetime):
+            # 確保有時區信息（假設是 UTC 時間）
+            if pub_time.tzinfo is None:
+                pub_time = pub_time.replace(tzinfo=timezone.utc)
+            if start_time <= pub_time <= end_time:
+                n['published_at'] = pub_time.astimezone(tz)
+                filtered_news.append(n)
+    return filtered_news
+
+
+# weekday() 位元遮罩：bit 5（週六）、bit 6（週日）不是交易日
+_WEEKEND_MASK = 0b1100000
+# 休市日（平日假日）；可在此添加台灣／美國假日
+_TW_HOLIDAYS: frozenset = frozenset()
+_US_HOLIDAYS: frozenset = frozenset()
+
+
+@lru_cache(maxsize=64)
+def _is_taiwan_trading_date(day: date) -> bool:
+    """台股交易日判斷（純日期 -> bool，依日期快取）"""
+    return not (_WEEKEND_MASK >> day.weekday()) & 1 and day not in _TW_HOLIDAYS
+
+
+@lru_cache(maxsize=64)
+def _is_us_trading_date(day: date) -> bool:
+    """美股交易日判斷（純日期 -> bool，依日期快取）"""
+    return not (_WEEKEND_MASK >> day.weekday()) & 1 and day not in _US_HOLIDAYS
+
+
+@dataclass(frozen=True)
+class MarketCfg:
+    """單一市場的盤前新聞設定"""
+    market: str                  # 快取鍵與 NewsFetcher 的 market 參數（'taiwan' / 'us'）
+    label: str                   # 結果中的市場名稱
+    log_name: str                # 錯誤訊息用名稱
+    tz: ZoneInfo
+    open_hour: int
+    open_minute: int
+    keywords: Tuple[str, ...]
+    fetch_hours: int             # 向 NewsFetcher 要求的時間範圍（小時）
+    period: str
+    is_trading_date: Callable[[date], bool]
+
+
+TAIWAN_CFG = MarketCfg(
+    market='taiwan', label='台股', log_name='Taiwan', tz=ZoneInfo('Asia/Taipei'),
+    open_hour=8, open_minute=30, keywords=TW_PREMARKET_KEYWORDS, fetch_hours=12,
+    period='前12小時', is_trading_date=_is_taiwan_trading_date,
+)
+US_CFG = MarketCfg(
+    market='us', label='美股', log_name='US', tz=ZoneInfo('US/Eastern'),
+    open_hour=9, open_minute=30, keywords=US_PREMARKET_KEYWORDS, fetch_hours=24,
+    period='開盤前12小時（美東9:30前）', is_trading_date=_is_us_trading_date,
+)
+
+
+def _disk_cache_path(market: str) -> str:
+    return os.path.join(CACHE_DIR, f'premarket_{market}.pkl')
+
+
+def _load_disk_cache(market: str) -> Optional[Tuple[float, Dict]]:
+    """讀取磁碟上的盤前新聞結果，回傳 (寫入時間, 結果)；不存在、損壞或已過期時回傳 None"""
+    try:
+        with open(_disk_cache_path(market), 'rb') as f:
+            stored_at, result = pickle.load(f)
+    except Exception:
+        return None
+    if time.time() - stored_at >= PREMARKET_CACHE_TTL:
+        return None
+    return stored_at, result
+
+
+def _save_disk_cache(market: str, stored_at: float, result: Dict) -> None:
+    """寫入磁碟快取（先寫暫存檔再 os.replace，多個 worker 同時寫入也不會讀到半個檔案）"""
+    path = _disk_cache_path(market)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((stored_at, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
 class PremarketAnalyzer:
     """盤前資料分析器"""
     
-    def __init__(self):
-        self.news_fetcher = NewsFetcher()
-        self.taiwan_tz = pytz.timezone('Asia/Taipei')
-        self.us_eastern_tz = pytz.timezone('US/Eastern')
+    def __init__(self, news_fetcher: Optional[NewsFetcher] = None):
+        self.news_fetcher = news_fetcher or default_news_fetcher()
+        self.taiwan_tz = TAIWAN_CFG.tz
+        self.us_eastern_tz = US_CFG.tz
+        # 市場（'taiwan' / 'us'）-> (寫入時間, 盤前新聞結果)
+        self._cache: Dict[str, Tuple[float, Dict]] = {}
     
     def _get_taiwan_market_time(self) -> datetime:
         """獲取台灣時間"""
@@ -36,13 +166,7 @@ class PremarketAnalyzer:
         """
         if dt is None:
             dt = self._get_taiwan_market_time()
-        
-        # 週六、週日不是交易日
-        if dt.weekday() >= 5:  # 5=Saturday, 6=Sunday
-            return False
-        
-        # 可以在此添加台灣假日判斷
-        return True
+        return _is_taiwan_trading_date(dt.date())
     
     def _is_us_trading_day(self, dt: datetime = None) -> bool:
         """
@@ -56,13 +180,7 @@ class PremarketAnalyzer:
         """
         if dt is None:
             dt = self._get_us_market_time()
-        
-        # 週六、週日不是交易日
-        if dt.weekday() >= 5:
-            return False
-        
-        # 可以在此添加美國假日判斷
-        return True
+        return _is_us_trading_date(dt.date())
     
     def _get_last_trading_day(self, market: str = 'taiwan') -> datetime:
         """
@@ -90,7 +208,7 @@ class PremarketAnalyzer:
             # 美股開盤時間為 9:30 AM ET
             return current.replace(hour=9, minute=30, second=0, microsecond=0)
     
-    def get_taiwan_premarket_news(self, force_refresh: bool = False) -> Dict:
+    def get_taiwan_premarket_news(self, force_refresh: bool = False, max_items: int = PREMARKET_MAX_ITEMS) -> Dict:
         """
         獲取台股盤前新聞
         邏輯：如果當前時間 < 今天 8:30，顯示今天8:30的盤前資料
@@ -99,101 +217,14 @@ class PremarketAnalyzer:
         
         Args:
             force_refresh: 是否強制刷新（忽略緩存）
+            max_items: 最多回傳幾則新聞（快取命中時沿用當時的結果）
         
         Returns:
             盤前新聞分析結果
         """
-        # 檢查緩存（除非強制刷新）
-        cache_key = 'taiwan_premarket_news'
-        if not force_refresh and hasattr(self, '_taiwan_premarket_cache'):
-            cache_data = getattr(self, '_taiwan_premarket_cache', None)
-            cache_time = getattr(self, '_taiwan_premarket_cache_time', 0)
-            if cache_data and (time.time() - cache_time) < 3600:  # 緩存1小時
-                return cache_data
-        
-        taiwan_time = self._get_taiwan_market_time()
-        today = taiwan_time.date()
-        
-        # 如果是週末，使用上週五的盤前資料
-        if not self._is_taiwan_trading_day():
-            # 週末：使用上週五 8:30 作為基準時間
-            days_back = taiwan_time.weekday() - 4  # 週六=5回退1天，週日=6回退2天
-            if days_back < 0:
-                days_back = 0
-            last_friday = taiwan_time - timedelta(days=days_back)
-            reference_time = last_friday.replace(hour=8, minute=30, second=0, microsecond=0)
-            # 確保有時區信息
-            if reference_time.tzinfo is None:
-                reference_time = self.taiwan_tz.localize(reference_time)
-            display_type = '盤前（週五）'
-        else:
-            # 交易日：使用今天 8:30 作為基準時間
-            reference_time = taiwan_time.replace(hour=8, minute=30, second=0, microsecond=0)
-            # 確保有時區信息
-            if reference_time.tzinfo is None:
-                reference_time = self.taiwan_tz.localize(reference_time)
-            
-            # 如果當前時間還沒到8:30，使用今天8:30
-            # 如果當前時間已經過了8:30，也使用今天8:30（保持到明天8:30）
-            if taiwan_time < reference_time:
-                display_type = '盤前'
-            else:
-                display_type = '盤前（今日）'
-        
-        # 計算12小時前的時間點（從8:30往前推12小時）
-        start_time = reference_time - timedelta(hours=12)
-        # 確保有時區信息
-        if start_time.tzinfo is None:
-            start_time = self.taiwan_tz.localize(start_time)
-        
-        try:
-            # 使用中文關鍵詞搜索台股盤前新聞（包含美股相關新聞）
-            keywords = ['台股', '盤前', '美股', '美股盤後']
-            news_list = self.news_fetcher.get_premarket_news(keywords, hours=12, market='taiwan')
-            
-            # 過濾時間範圍內的新聞（從start_time到reference_time）
-            filtered_news = []
-            for n in news_list:
-                pub_time = n.get('published_at')
-                if isinstance(pub_time, datetime):
-                    # 確保時區一致（轉換為台灣時間）
-                    if pub_time.tzinfo is None:
-                        # 假設是 UTC 時間
-                        pub_time = pub_time.replace(tzinfo=timezone.utc)
-                    # 轉換為台灣時間
-                    pub_time_tw = pub_time.astimezone(self.taiwan_tz)
-                    
-                    if start_time <= pub_time_tw <= reference_time:
-                        # 更新為台灣時間
-                        n['published_at'] = pub_time_tw
-                        filtered_news.append(n)
-            
-            # 按標題排序（不區分大小寫）
-            filtered_news.sort(key=lambda x: x.get('title', '').lower() if x.get('title') else '')
-            
-        except Exception as e:
-            print(f"Error fetching Taiwan premarket news: {str(e)}")
-            filtered_news = []
-        
-        result = {
-            'market': '台股',
-            'type': display_type,
-            'period': '前12小時',
-            'reference_time': reference_time.isoformat(),
-            'start_time': start_time.isoformat(),
-            'current_time': taiwan_time.isoformat(),
-            'news_count': len(filtered_news),
-            'news': filtered_news,  # 返回所有新聞
-            'timestamp': datetime.now(self.taiwan_tz).isoformat()
-        }
-        
-        # 更新緩存
-        self._taiwan_premarket_cache = result
-        self._taiwan_premarket_cache_time = time.time()
-        
-        return result
+        return self._get_premarket_news(TAIWAN_CFG, force_refresh, max_items)
     
-    def get_us_premarket_news(self, force_refresh: bool = False) -> Dict:
+    def get_us_premarket_news(self, force_refresh: bool = False, max_items: int = PREMARKET_MAX_ITEMS) -> Dict:
         """
         獲取美股盤前新聞
         邏輯：美股 9:30 開盤，盤前 = 開盤前 12 小時內的新聞（start_time ～ 9:30 ET）
@@ -203,83 +234,85 @@ class PremarketAnalyzer:
         
         Args:
             force_refresh: 是否強制刷新（忽略緩存）
+            max_items: 最多回傳幾則新聞（快取命中時沿用當時的結果）
         
         Returns:
             盤前新聞分析結果
         """
+        return self._get_premarket_news(US_CFG, force_refresh, max_items)
+    
+    def _get_premarket_news(self, cfg: MarketCfg, force_refresh: bool, max_items: int) -> Dict:
+        """
+        台股／美股共用的盤前新聞流程：快取 -> 基準時間（開盤時間）-> 抓取 -> 過濾、排序 -> 寫回快取
+        盤前 = 開盤前 12 小時內的新聞（reference_time - 12h ～ reference_time）
+        """
         # 檢查緩存（除非強制刷新）
-        cache_key = 'us_premarket_news'
-        if not force_refresh and hasattr(self, '_us_premarket_cache'):
-            cache_data = getattr(self, '_us_premarket_cache', None)
-            cache_time = getattr(self, '_us_premarket_cache_time', 0)
-            if cache_data and (time.time() - cache_time) < 3600:  # 緩存1小時
-                return cache_data
+        if not force_refresh:
+            entry = self._cache.get(cfg.market)
+            if entry and (time.time() - entry[0]) < PREMARKET_CACHE_TTL:  # 緩存1小時
+                return entry[1]
+        # 程序重啟或其他 worker 已抓過時，從磁碟快取取回
+        if not force_refresh:
+            hit = _load_disk_cache(cfg.market)
+            if hit is not None:
+                self._cache[cfg.market] = hit
+                return hit[1]
         
-        us_time = self._get_us_market_time()
-        # 美股開盤時間 9:30 AM ET
-        market_open_hour, market_open_minute = 9, 30
+        # 整個呼叫只取一次現在時間，交易日判斷與 timestamp 都沿用
+        market_time = datetime.now(cfg.tz)
         
-        # 如果是週末，使用上週五的盤前資料
-        if not self._is_us_trading_day():
-            days_back = us_time.weekday() - 4  # 週六=5回退1天，週日=6回退2天
-            if days_back < 0:
-                days_back = 0
-            last_friday = us_time - timedelta(days=days_back)
-            reference_time = last_friday.replace(hour=market_open_hour, minute=market_open_minute, second=0, microsecond=0)
-            if reference_time.tzinfo is None:
-                reference_time = self.us_eastern_tz.localize(reference_time)
+        if not cfg.is_trading_date(market_time.date()):
+            # 週末：使用上週五開盤時間作為基準時間
+            days_back = max(market_time.weekday() - 4, 0)  # 週六=5回退1天，週日=6回退2天
+            last_friday = market_time - timedelta(days=days_back)
+            reference_time = last_friday.replace(hour=cfg.open_hour, minute=cfg.open_minute, second=0, microsecond=0)
             display_type = '盤前（週五）'
         else:
-            reference_time = us_time.replace(hour=market_open_hour, minute=market_open_minute, second=0, microsecond=0)
-            if reference_time.tzinfo is None:
-                reference_time = self.us_eastern_tz.localize(reference_time)
-            if us_time < reference_time:
+            # 交易日：使用今天開盤時間作為基準時間（開盤後仍保持到明天開盤）
+            reference_time = market_time.replace(hour=cfg.open_hour, minute=cfg.open_minute, second=0, microsecond=0)
+            if market_time < reference_time:
                 display_type = '盤前'
             else:
                 display_type = '盤前（今日）'
         
-        # 盤前 = 開盤前 12 小時內：從 reference_time - 12h 到 reference_time
+        # 從開盤時間往前推12小時
         start_time = reference_time - timedelta(hours=12)
-        if start_time.tzinfo is None:
-            start_time = self.us_eastern_tz.localize(start_time)
         
+        fetched = False
         try:
-            keywords = ['premarket', 'stock', 'market', 'earnings', 'earnings report']
-            news_list = self.news_fetcher.get_premarket_news(keywords, hours=24, market='us')
+            news_list = self.news_fetcher.get_premarket_news(
+                cfg.keywords, hours=cfg.fetch_hours, market=cfg.market,
+                start_ts=start_time.timestamp(), end_ts=reference_time.timestamp())
             
-            # 只保留「開盤前 12 小時內」的新聞：start_time <= 發佈時間 <= reference_time
-            filtered_news = []
-            for n in news_list:
-                pub_time = n.get('published_at')
-                if isinstance(pub_time, datetime):
-                    if pub_time.tzinfo is None:
-                        pub_time = pub_time.replace(tzinfo=timezone.utc)
-                    pub_time_et = pub_time.astimezone(self.us_eastern_tz)
-                    if start_time <= pub_time_et <= reference_time:
-                        n['published_at'] = pub_time_et
-                        filtered_news.append(n)
+            # 只保留 start_time <= 發佈時間 <= reference_time 的新聞，發佈時間更新為該市場時區
+            filtered_news = _filter_window(news_list, cfg.tz, start_time, reference_time)
             
-            filtered_news.sort(key=lambda x: x.get('title', '').lower() if x.get('title') else '')
+            # 按標題排序（不區分大小寫），只取前 max_items 則：部分排序即可
+            filtered_news = heapq.nsmallest(max_items, filtered_news, key=_title_sort_key)
+            fetched = True
             
         except Exception as e:
-            print(f"Error fetching US premarket news: {str(e)}")
+            print(f"Error fetching {cfg.log_name} premarket news: {str(e)}")
             filtered_news = []
         
+        current_iso = market_time.isoformat()
         result = {
-            'market': '美股',
+            'market': cfg.label,
             'type': display_type,
-            'period': '開盤前12小時（美東9:30前）',
+            'period': cfg.period,
             'reference_time': reference_time.isoformat(),
             'start_time': start_time.isoformat(),
-            'current_time': us_time.isoformat(),
+            'current_time': current_iso,
             'news_count': len(filtered_news),
-            'news': filtered_news,  # 返回所有新聞
-            'timestamp': datetime.now(self.us_eastern_tz).isoformat()
+            'news': filtered_news,  # 最多 max_items 則
+            'timestamp': current_iso
         }
         
-        # 更新緩存
-        self._us_premarket_cache = result
-        self._us_premarket_cache_time = time.time()
+        # 更新緩存（僅抓取成功時；失敗的空結果不快取，下次請求會重試）
+        if fetched:
+            stored_at = time.time()
+            self._cache[cfg.market] = (stored_at, result)
+            _save_disk_cache(cfg.market, stored_at, result)
         
         return result
     
@@ -290,12 +323,15 @@ class PremarketAnalyzer:
         Returns:
             包含台股和美股盤前資料的字典
         """
+        # 台股與美股新聞互不相依，同時抓取（總耗時取決於較慢的一邊）
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            taiwan_future = executor.submit(self.get_taiwan_premarket_news, force_refresh=False)
+            us_future = executor.submit(self.get_us_premarket_news, force_refresh=False)
+        
         try:
-            taiwan_data = self.get_taiwan_premarket_news(force_refresh=False)
+            taiwan_data = taiwan_future.result()
         except Exception as e:
-            print(f"Error getting Taiwan premarket news: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error getting Taiwan premarket news: %s", e)
             taiwan_data = {
                 'market': '台股',
                 'type': '錯誤',
@@ -305,11 +341,9 @@ class PremarketAnalyzer:
             }
         
         try:
-            us_data = self.get_us_premarket_news(force_refresh=False)
+            us_data = us_future.result()
         except Exception as e:
-            print(f"Error getting US premarket news: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error getting US premarket news: %s", e)
             us_data = {
                 'market': '美股',
                 'type': '錯誤',
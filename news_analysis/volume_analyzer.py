@@ -2,16 +2,23 @@
 聲量分析模組 - 分析前24小時公司新聞出現頻率
 """
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 from collections import Counter
-from news_analysis.news_fetcher import NewsFetcher
+import heapq
+from news_analysis.news_fetcher import NewsFetcher, default_news_fetcher
+from market_data.log_util import get_logger
 from config import Config
 
+log = get_logger(__name__)
+
 class VolumeAnalyzer:
     """聲量分析器"""
     
-    def __init__(self):
-        self.news_fetcher = NewsFetcher()
+    def __init__(self, news_fetcher: Optional[NewsFetcher] = None):
+        self.news_fetcher = news_fetcher or default_news_fetcher()
+        # 代號 -> 名稱對照（Config 為靜態常數，建一次重複使用）
+        self._company_names = {**Config.US_INDICES, **Config.US_STOCKS,
+                               **Config.TW_MARKETS, **Config.INTERNATIONAL_MARKETS}
     
     def get_top_companies_by_volume(self, hours: int = 24, top_n: int = 20) -> List[Dict]:
         """
@@ -30,17 +37,11 @@ class VolumeAnalyzer:
             volume_dict = result['volume']
             news_by_symbol = result.get('news_by_symbol', {})
             
-            company_names = {}
-            company_names.update(Config.US_INDICES)
-            company_names.update(Config.US_STOCKS)
-            company_names.update(Config.TW_MARKETS)
-            company_names.update(Config.INTERNATIONAL_MARKETS)
-            
             volume_list = []
-            for symbol, count in sorted(volume_dict.items(), key=lambda x: x[1], reverse=True)[:top_n]:
+            for symbol, count in heapq.nlargest(top_n, volume_dict.items(), key=lambda x: x[1]):
                 volume_list.append({
                     'symbol': symbol,
-                    'name': company_names.get(symbol, symbol),
+                    'name': self._company_names.get(symbol, symbol),
                     'count': count,
                     'rank': len(volume_list) + 1,
                     'news': news_by_symbol.get(symbol, []),
@@ -48,9 +49,7 @@ class VolumeAnalyzer:
             
             return volume_list
         except Exception as e:
-            print(f"Error in get_top_companies_by_volume: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error in get_top_companies_by_volume: %s", e)
             return []
     
     def get_volume_summary(self, refresh: bool = False) -> Dict:
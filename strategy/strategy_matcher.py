@@ -4,6 +4,25 @@
 from typing import Dict, List, Optional
 from datetime import datetime
 
+# (信號, 漲跌幅區間) -> (策略, 信心度, 理由)；區間：strong 為 >2%，flat 為 <0.5%，其餘為 mid
+_STRATEGY_RULES = {
+    ('BULLISH', 'strong'): ('momentum', 75, '強勁上漲趨勢，適合動量策略'),
+    ('BEARISH', 'strong'): ('mean_reversion', 70, '大幅下跌後可能反彈，適合均值回歸'),
+    ('NEUTRAL', 'flat'): ('breakout', 60, '市場整理，等待突破機會'),
+    ('BULLISH', 'mid'): ('trend_following', 65, '溫和上漲，適合趨勢跟隨'),
+    ('BULLISH', 'flat'): ('trend_following', 65, '溫和上漲，適合趨勢跟隨'),
+}
+_DEFAULT_RULE = ('mean_reversion', 55, '市場震盪，適合均值回歸')
+
+
+def _change_bucket(change_percent: float) -> str:
+    """漲跌幅（絕對值）分區"""
+    if change_percent > 2:
+        return 'strong'
+    if change_percent < 0.5:
+        return 'flat'
+    return 'mid'
+
 class StrategyMatcher:
     """策略匹配器"""
     
@@ -54,27 +73,9 @@ class StrategyMatcher:
         change_percent = abs(market_data.get('change_percent', 0))
         volume = market_data.get('volume', 0)
         
-        # 簡單的策略匹配邏輯（後續可擴展為更複雜的算法）
-        if signal == 'BULLISH' and change_percent > 2:
-            strategy = 'momentum'
-            confidence = 75
-            reason = '強勁上漲趨勢，適合動量策略'
-        elif signal == 'BEARISH' and change_percent > 2:
-            strategy = 'mean_reversion'
-            confidence = 70
-            reason = '大幅下跌後可能反彈，適合均值回歸'
-        elif signal == 'NEUTRAL' and change_percent < 0.5:
-            strategy = 'breakout'
-            confidence = 60
-            reason = '市場整理，等待突破機會'
-        elif signal == 'BULLISH':
-            strategy = 'trend_following'
-            confidence = 65
-            reason = '溫和上漲，適合趨勢跟隨'
-        else:
-            strategy = 'mean_reversion'
-            confidence = 55
-            reason = '市場震盪，適合均值回歸'
+        # 簡單的策略匹配邏輯（後續可擴展為更複雜的算法）：查表，未列出的組合視為震盪
+        strategy, confidence, reason = _STRATEGY_RULES.get(
+            (signal, _change_bucket(change_percent)), _DEFAULT_RULE)
         
         strategy_info = self.strategies.get(strategy, {})
         